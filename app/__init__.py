@@ -28,7 +28,7 @@ def create_app(config_name=None):
     try:
         if app.config.get('STORAGE_BACKEND') == 'r2':
             from app.integrations.file_storage import CloudflareR2Storage, FileStorageError
-            app.r2_storage = CloudflareR2Storage()
+            app.r2_storage = CloudflareR2Storage(upload_workers=app.config['UPLOAD_WORKERS'])
             logger.info("CloudflareR2 storage initialized successfully")
         else:
             app.r2_storage = None
@@ -42,6 +42,13 @@ def create_app(config_name=None):
     from app.models import db
     db.init_app(app)
 
+    # Compress responses (gzip/brotli negotiated via Accept-Encoding)
+    try:
+        from flask_compress import Compress
+        Compress(app)
+    except ImportError:
+        logger.info("Flask-Compress not installed; responses will not be compressed")
+
     # Initialize Flask-Login
     login_manager = LoginManager()
     login_manager.init_app(app)
@@ -52,7 +59,8 @@ def create_app(config_name=None):
     @login_manager.user_loader
     def load_user(user_id):
         from app.models import User
-        return User.query.get(int(user_id))
+        # Session.get checks the identity map before issuing a SELECT
+        return db.session.get(User, int(user_id))
 
     # Create tables
     with app.app_context():
@@ -1,13 +1,18 @@
 import os
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.config import Config
 from botocore.exceptions import ClientError, NoCredentialsError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from flask import current_app
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
 from typing import Dict, List, Optional, Callable, Union, BinaryIO
 import mimetypes
 import hashlib
 import logging
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 required_envs = [
@@ -32,11 +37,31 @@ MAX_PART_SIZE = 5 * 1024 * 1024 * 1024  # 5GB - R2 maximum
 MAX_PARTS = 10000  # R2 maximum parts per upload
 MAX_FILE_SIZE = 5 * 1024 * 1024 * 1024  # 5GB - R2 maximum object size
 
-ALLOWED_IMAGE_TYPES = {'.jpg', '.jpeg', '.png', '.webp', '.tiff', '.bmp', '.gif'}
-ALLOWED_MIME_TYPES = {
-    'image/jpeg', 'image/png', 'image/webp', 'image/tiff',
-    'image/bmp', 'image/gif'
-}
+# Files above TRANSFER_CHUNK_SIZE are sent by upload_fileobj as parallel multipart parts
+TRANSFER_CHUNK_SIZE = 8 * 1024 * 1024  # 8MB
+TRANSFER_MAX_CONCURRENCY = 8  # Parts in flight per file
+MULTIPART_MAX_PENDING = 2 * TRANSFER_MAX_CONCURRENCY  # Parts read ahead of the uploads in _multipart_upload
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=TRANSFER_CHUNK_SIZE,
+    multipart_chunksize=TRANSFER_CHUNK_SIZE,
+    max_concurrency=TRANSFER_MAX_CONCURRENCY,
+    use_threads=True
+)
+
+ALLOWED_IMAGE_TYPES = frozenset({
+    '.jpg', '.jpeg', '.png', '.webp', '.tiff', '.bmp', '.gif', '.heic', '.heif', '.dng'
+})
+# The one upload allowlist: the collection routes validate and presign against it
+# too, so nothing the browser is told to upload is rejected by storage later
+ALLOWED_MIME_TYPES = frozenset({
+    'image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/tiff',
+    'image/heic', 'image/heif', 'image/x-adobe-dng', 'image/bmp', 'image/gif'
+})
+
+# Presigned URLs are reused for half their lifetime, so a cached URL always has
+# at least half its expiry left when handed out
+PRESIGNED_URL_CACHE_SIZE = 10000
 
 logger = logging.getLogger(__name__)
 
@@ -53,14 +78,51 @@ class UploadError(FileStorageError):
     pass
 
 
+class PresignedUrlCache:
+    """Thread-safe LRU cache of presigned URLs with per-entry expiry."""
+
+    def __init__(self, maxsize: int = PRESIGNED_URL_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, cache_key) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is None:
+                return None
+
+            url, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[cache_key]
+                return None
+
+            self._entries.move_to_end(cache_key)
+            return url
+
+    def set(self, cache_key, url: str, ttl: float) -> None:
+        with self._lock:
+            self._entries[cache_key] = (url, time.monotonic() + ttl)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
 class CloudflareR2Storage:
-    def __init__(self):
+    def __init__(self, upload_workers: Optional[int] = None):
         self.account_id = R2_ACCOUNT_ID
         self.access_key_id = R2_ACCESS_KEY_ID
         self.secret_access_key = R2_SECRET_ACCESS_KEY
         self.bucket_name = R2_BUCKET_NAME
         self.region = R2_REGION
 
+        # Files the app's upload pool sends at once (Config.UPLOAD_WORKERS)
+        if upload_workers is None:
+            upload_workers = current_app.config['UPLOAD_WORKERS']
+        self.upload_workers = upload_workers
+
+        self.presigned_urls = PresignedUrlCache()
+
         self._validate_config()
         self.client = self._create_client()
         self._verify_connection()
@@ -87,8 +149,11 @@ class CloudflareR2Storage:
                 config=Config(
                     signature_version='s3v4',
                     s3={'addressing_style': 'path'},
-                    retries={'max_attempts': 3},
-                    max_pool_connections=50
+                    # Throttling, 5xx and connection errors are retried here, per
+                    # request and per part, for single-part and multipart uploads alike
+                    retries={'mode': 'adaptive', 'max_attempts': 5},
+                    # Enough connections for every part of every concurrent file
+                    max_pool_connections=TRANSFER_MAX_CONCURRENCY * self.upload_workers
                 ),
                 region_name=self.region
             )
@@ -129,7 +194,7 @@ class CloudflareR2Storage:
     def validate_file(self, file_obj: BinaryIO, filename: str) -> Dict[str, any]:
         file_ext = Path(filename).suffix.lower()
         if file_ext not in ALLOWED_IMAGE_TYPES:
-            raise ValidationError(f"Unsupported file type: {file_ext}. Allowed: {', '.join(ALLOWED_IMAGE_TYPES)}")
+            raise ValidationError(f"Unsupported file type: {file_ext}. Allowed: {', '.join(sorted(ALLOWED_IMAGE_TYPES))}")
 
         file_obj.seek(0, 2)
         file_size = file_obj.tell()
@@ -198,7 +263,7 @@ class CloudflareR2Storage:
             extra_args['Metadata'] = metadata
 
         try:
-            logger.info(f"Starting upload: {key} ({file_info['file_size']} bytes)")
+            logger.debug("Starting upload: %s (%d bytes)", key, file_info['file_size'])
 
             if self._should_use_multipart(file_info['file_size']):
                 result = self._multipart_upload(file_obj, key, extra_args, progress_callback)
@@ -214,7 +279,8 @@ class CloudflareR2Storage:
                     self.bucket_name,
                     key,
                     ExtraArgs=extra_args,
-                    Callback=callback_wrapper
+                    Callback=callback_wrapper,
+                    Config=TRANSFER_CONFIG
                 )
                 result = {
                     'key': key,
@@ -223,7 +289,7 @@ class CloudflareR2Storage:
                     'upload_method': 'single_part'
                 }
 
-            logger.info(f"Upload successful: {key}")
+            logger.debug("Upload successful: %s", key)
             return result
 
         except ClientError as e:
@@ -243,7 +309,7 @@ class CloudflareR2Storage:
         part_size = self._calculate_part_size(file_size)
         parts_count = (file_size + part_size - 1) // part_size
 
-        logger.info(f"Starting multipart upload: {key}, {parts_count} parts of {part_size} bytes each")
+        logger.info("Starting multipart upload: %s, %d parts of %d bytes each", key, parts_count, part_size)
 
         try:
             response = self.client.create_multipart_upload(
@@ -256,16 +322,7 @@ class CloudflareR2Storage:
             parts = []
             bytes_uploaded = 0
 
-            for part_num in range(1, parts_count + 1):
-                start_byte = (part_num - 1) * part_size
-
-                if part_num == parts_count:
-                    end_byte = file_size
-                else:
-                    end_byte = start_byte + part_size
-
-                part_data = file_obj.read(end_byte - start_byte)
-
+            def upload_part(part_num, part_data):
                 part_response = self.client.upload_part(
                     Bucket=self.bucket_name,
                     Key=key,
@@ -273,18 +330,35 @@ class CloudflareR2Storage:
                     UploadId=upload_id,
                     Body=part_data
                 )
+                return {'ETag': part_response['ETag'], 'PartNumber': part_num}, len(part_data)
 
-                parts.append({
-                    'ETag': part_response['ETag'],
-                    'PartNumber': part_num
-                })
+            def collect(done):
+                nonlocal bytes_uploaded
+                for future in done:
+                    part, part_length = future.result()
+                    parts.append(part)
+                    bytes_uploaded += part_length
 
-                bytes_uploaded += len(part_data)
+                    if progress_callback:
+                        progress_callback(bytes_uploaded, file_size)
 
-                if progress_callback:
-                    progress_callback(bytes_uploaded, file_size)
+                    logger.debug("Uploaded part %d/%d", part['PartNumber'], parts_count)
+
+            # Parts are read in order but uploaded concurrently; at most
+            # MULTIPART_MAX_PENDING parts are held in memory at once
+            with ThreadPoolExecutor(max_workers=TRANSFER_MAX_CONCURRENCY) as executor:
+                pending = set()
+                for part_num in range(1, parts_count + 1):
+                    if len(pending) >= MULTIPART_MAX_PENDING:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        collect(done)
+
+                    part_data = file_obj.read(part_size)
+                    pending.add(executor.submit(upload_part, part_num, part_data))
+
+                collect(wait(pending).done)
 
-                logger.debug(f"Uploaded part {part_num}/{parts_count}")
+            parts.sort(key=lambda part: part['PartNumber'])
 
             self.client.complete_multipart_upload(
                 Bucket=self.bucket_name,
@@ -397,6 +471,20 @@ class CloudflareR2Storage:
                 return None
             self._handle_r2_errors(e)
 
+    def read_file_header(self, key: str, length: int) -> bytes:
+        try:
+            response = self.client.get_object(
+                Bucket=self.bucket_name,
+                Key=key,
+                Range=f'bytes=0-{length - 1}'
+            )
+            return response['Body'].read()
+
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'NoSuchKey':
+                return b''
+            self._handle_r2_errors(e)
+
     def delete_file(self, key: str) -> bool:
         try:
             self.client.delete_object(Bucket=self.bucket_name, Key=key)
@@ -472,6 +560,11 @@ class CloudflareR2Storage:
         if expiry_seconds > 604800:  # 7 days
             raise ValidationError("Presigned URL expiry cannot exceed 7 days")
 
+        cache_key = (http_method, key, expiry_seconds)
+        url = self.presigned_urls.get(cache_key)
+        if url is not None:
+            return url
+
         try:
             url = self.client.generate_presigned_url(
                 http_method,
@@ -479,7 +572,39 @@ class CloudflareR2Storage:
                 ExpiresIn=expiry_seconds
             )
 
-            logger.debug(f"Generated presigned URL for {key} (expires in {expiry_seconds}s)")
+            self.presigned_urls.set(cache_key, url, expiry_seconds / 2)
+            logger.debug("Generated presigned URL for %s (expires in %ss)", key, expiry_seconds)
+            return url
+
+        except ClientError as e:
+            self._handle_r2_errors(e)
+
+    def generate_presigned_upload(
+        self,
+        key: str,
+        content_type: str,
+        expiry_seconds: int = 3600,
+        metadata: Dict[str, str] = None
+    ) -> str:
+        if expiry_seconds > 604800:  # 7 days
+            raise ValidationError("Presigned URL expiry cannot exceed 7 days")
+
+        if content_type not in ALLOWED_MIME_TYPES:
+            raise ValidationError(f"Invalid MIME type: {content_type}")
+
+        params = {'Bucket': self.bucket_name, 'Key': key, 'ContentType': content_type}
+        if metadata:
+            params['Metadata'] = metadata
+
+        try:
+            # R2 does not accept presigned POST policies, so the browser PUTs the object
+            url = self.client.generate_presigned_url(
+                'put_object',
+                Params=params,
+                ExpiresIn=expiry_seconds
+            )
+
+            logger.debug("Generated presigned upload URL for %s (expires in %ss)", key, expiry_seconds)
             return url
 
         except ClientError as e:
@@ -2,8 +2,10 @@
 Database models for The Open Harbor application.
 """
 
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
+from sqlalchemy.orm import validates
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, timezone
 import re
@@ -11,6 +13,17 @@ import uuid
 
 db = SQLAlchemy()
 
+# At least 8 characters with an uppercase letter, a lowercase letter and a digit
+PASSWORD_PATTERN = re.compile(r'(?=.*[A-Z])(?=.*[a-z])(?=.*\d).{8,}', re.DOTALL)
+
+
+def hash_password(password):
+    """Hash a password with the app's PASSWORD_HASH_METHOD, or Werkzeug's default."""
+    method = current_app.config.get('PASSWORD_HASH_METHOD') if has_app_context() else None
+    if method:
+        return generate_password_hash(password, method=method)
+    return generate_password_hash(password)
+
 
 class User(UserMixin, db.Model):
     """User model for authentication."""
@@ -31,7 +44,7 @@ class User(UserMixin, db.Model):
         """Hash and set the user's password."""
         if not self._is_valid_password(password):
             raise ValueError("Password does not meet security requirements")
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
         """Check if the provided password matches the hash."""
@@ -45,15 +58,7 @@ class User(UserMixin, db.Model):
         - Contains uppercase and lowercase letters
         - Contains at least one digit
         """
-        if len(password) < 8:
-            return False
-        if not re.search(r'[A-Z]', password):
-            return False
-        if not re.search(r'[a-z]', password):
-            return False
-        if not re.search(r'\d', password):
-            return False
-        return True
+        return PASSWORD_PATTERN.fullmatch(password) is not None
 
     @staticmethod
     def is_valid_email(email):
@@ -85,20 +90,26 @@ class Collection(db.Model):
     __tablename__ = 'collections'
 
     id = db.Column(db.Integer, primary_key=True)
-    uuid = db.Column(db.String(36), unique=True, nullable=False, index=True, default=lambda: str(uuid.uuid4()))
+    uuid = db.Column(db.Uuid, unique=True, nullable=False, index=True, default=uuid.uuid4)
     name = db.Column(db.String(255), nullable=False)
     description = db.Column(db.Text)
     privacy = db.Column(db.String(20), default='unlisted', nullable=False)  # public, unlisted, password
     password_hash = db.Column(db.String(255))
-    expires_at = db.Column(db.DateTime)
+    expires_at = db.Column(db.DateTime, index=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     updated_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc))
 
     # Foreign key to user
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
 
-    # Relationship to files
-    files = db.relationship('File', backref='collection', lazy=True, cascade='all, delete-orphan')
+    # Relationship to files, in upload order (served by ix_files_collection_created)
+    files = db.relationship('File', backref='collection', lazy=True, cascade='all, delete-orphan',
+                            order_by='[File.created_at, File.id]')
+
+    # A user's collections are listed newest first
+    __table_args__ = (
+        db.Index('ix_collections_user_created', 'user_id', 'created_at'),
+    )
 
     def __repr__(self):
         return f'<Collection {self.name}>'
@@ -116,7 +127,7 @@ class Collection(db.Model):
     def set_password(self, password):
         """Set password for password-protected collections."""
         if password:
-            self.password_hash = generate_password_hash(password)
+            self.password_hash = hash_password(password)
         else:
             self.password_hash = None
 
@@ -133,10 +144,13 @@ class File(db.Model):
     __tablename__ = 'files'
 
     id = db.Column(db.Integer, primary_key=True)
-    uuid = db.Column(db.String(36), unique=True, nullable=False, index=True, default=lambda: str(uuid.uuid4()))
+    # Client-generated and unique, so it can match RETURNING rows back to objects and
+    # let a batch of new files be written as one multi-row INSERT (even on SQLite)
+    uuid = db.Column(db.Uuid, unique=True, nullable=False, index=True, default=uuid.uuid4, insert_sentinel=True)
     filename = db.Column(db.String(255), nullable=False)
     original_filename = db.Column(db.String(255), nullable=False)
-    mime_type = db.Column(db.String(100), nullable=False)
+    mime_type = db.Column(db.String(100), nullable=False)  # Sniffed from content at upload
+    is_image = db.Column(db.Boolean, nullable=False, default=False)  # Derived from mime_type
     size = db.Column(db.Integer, nullable=False)  # Size in bytes
     storage_path = db.Column(db.String(500), nullable=False)  # Original full-quality image
 
@@ -155,6 +169,10 @@ class File(db.Model):
     # Foreign key to collection
     collection_id = db.Column(db.Integer, db.ForeignKey('collections.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_files_collection_created', 'collection_id', 'created_at'),
+    )
+
     def __repr__(self):
         return f'<File {self.original_filename}>'
 
@@ -175,17 +193,18 @@ class File(db.Model):
         """Check if file is stored in R2."""
         return self.storage_backend == 'r2'
 
-    @property
-    def is_image(self):
-        """Check if file is an image."""
-        return self.mime_type and self.mime_type.startswith('image/')
+    @validates('mime_type')
+    def _set_is_image(self, key, mime_type):
+        """Keep is_image in step with the stored MIME type."""
+        self.is_image = bool(mime_type and mime_type.startswith('image/'))
+        return mime_type
 
     @property
     def storage_url(self):
         """Get storage URL based on backend."""
         if self.is_r2_file:
-            from app.services.storage_service import StorageService
-            storage = StorageService()
+            from app.services.storage_service import get_storage_service
+            storage = get_storage_service()
             return storage.generate_file_url(self)
         else:
             from flask import url_for
@@ -0,0 +1,33 @@
+"""
+Shared background thread pools for The Open Harbor application.
+
+Pools are created lazily, one per application, and stored in
+app.extensions so every request in a process reuses the same threads.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_executor_lock = threading.Lock()
+
+
+def get_app_executor(app, name: str, max_workers: int) -> ThreadPoolExecutor:
+    """
+    Return the named thread pool for an application, creating it on first use.
+
+    Args:
+        app: Flask application owning the pool
+        name: Key under app.extensions, also used as the thread name prefix
+        max_workers: Pool size used when the pool is first created
+
+    Returns:
+        ThreadPoolExecutor shared by all callers using the same name
+    """
+    executor = app.extensions.get(name)
+    if executor is None:
+        with _executor_lock:
+            executor = app.extensions.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+                app.extensions[name] = executor
+    return executor
@@ -7,15 +7,41 @@ import os
 import time
 import logging
 import mimetypes
+import uuid
 from typing import List, Dict, Optional, BinaryIO, Union
 from io import BytesIO
+from concurrent.futures import Future
+from functools import partial
 from flask import current_app
 
-from app.integrations.file_storage import CloudflareR2Storage, ValidationError, UploadError
+from app.integrations.file_storage import (
+    CloudflareR2Storage, ValidationError, UploadError, ALLOWED_MIME_TYPES
+)
 from app.models import File, Collection
+from app.services.executors import get_app_executor
 
 logger = logging.getLogger(__name__)
 
+# Number of leading bytes inspected when sniffing a file's type
+MIME_SNIFF_BYTES = 32
+
+# Magic-number signatures for supported image formats: (offset, prefix, mime type)
+IMAGE_SIGNATURES = (
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'BM', 'image/bmp'),
+)
+
+# ISO-BMFF brands (bytes 8-12 after an 'ftyp' box) used by HEIC/HEIF images
+HEIF_BRANDS = {
+    b'heic': 'image/heic', b'heix': 'image/heic', b'hevc': 'image/heic', b'hevx': 'image/heic',
+    b'heim': 'image/heic', b'heis': 'image/heic', b'mif1': 'image/heif', b'msf1': 'image/heif',
+}
+
 
 class StorageService:
     """Unified storage service supporting multiple backends."""
@@ -75,12 +101,34 @@ class StorageService:
                 'storage_info': None
             }
 
+    def submit_upload(self, file_obj: BinaryIO, filename: str, collection: Collection,
+                      progress_callback: Optional[callable] = None,
+                      on_complete: Optional[callable] = None) -> Future:
+        """
+        Run upload_file on the application's shared upload pool.
+
+        The returned future resolves to the same result dict as upload_file.
+        The caller must keep file_obj open until the future is done.
+        If given, on_complete is called with the result on the worker thread
+        before the future resolves, so follow-up work can start immediately.
+        """
+        app = current_app._get_current_object()
+
+        def run_upload():
+            with app.app_context():
+                result = self.upload_file(file_obj, filename, collection, progress_callback)
+                if on_complete is not None:
+                    on_complete(result)
+                return result
+
+        upload_pool = get_app_executor(app, 'upload_pool', app.config.get('UPLOAD_WORKERS', 16))
+        return upload_pool.submit(run_upload)
+
     def _upload_to_r2(self, file_obj: BinaryIO, filename: str, collection: Collection,
                      progress_callback: Optional[callable] = None) -> Dict[str, any]:
         """Upload file to CloudflareR2 storage."""
         try:
-            # Generate storage key with collection context
-            storage_key = f"collections/{collection.uuid}/{filename}"
+            storage_key = self._r2_storage_key(collection, filename)
 
             # Add metadata for tracking
             metadata = {
@@ -90,6 +138,11 @@ class StorageService:
                 'upload_timestamp': str(int(time.time()))
             }
 
+            # Only images go to R2; trust the file's bytes rather than its name
+            mime_type = self._sniff_mime_type(file_obj)
+            if mime_type not in ALLOWED_MIME_TYPES:
+                raise ValidationError("File content is not a supported image type")
+
             # Upload to R2
             result = self.r2_storage.upload_single_file(
                 file_obj=file_obj,
@@ -103,7 +156,7 @@ class StorageService:
             file_record = File(
                 filename=os.path.basename(result['key']),
                 original_filename=filename,
-                mime_type=self._get_mime_type(filename),
+                mime_type=mime_type,
                 size=result['size'],
                 storage_path=result['key'],  # R2 key path
                 storage_backend='r2',
@@ -137,12 +190,10 @@ class StorageService:
     def _upload_to_local(self, file_obj: BinaryIO, filename: str, collection: Collection) -> Dict[str, any]:
         """Upload file to local storage (fallback/development)."""
         try:
-            import uuid
-
-            # Generate unique filename
-            file_uuid = str(uuid.uuid4())
-            file_extension = os.path.splitext(filename)[1].lower()
-            storage_filename = f"{file_uuid}{file_extension}"
+            # Generate unique filename (leading dots are not extensions)
+            dot = filename.rfind('.')
+            file_extension = filename[dot:].lower() if dot > 0 else ''
+            storage_filename = uuid.uuid4().hex + file_extension
 
             # Create upload directory
             upload_dir = os.path.join(current_app.instance_path, 'uploads', str(collection.uuid))
@@ -151,6 +202,8 @@ class StorageService:
             # Save file
             storage_path = os.path.join(upload_dir, storage_filename)
 
+            mime_type = self._detect_mime_type(file_obj, filename)
+
             # Reset file object position
             file_obj.seek(0)
 
@@ -161,7 +214,7 @@ class StorageService:
             file_record = File(
                 filename=storage_filename,
                 original_filename=filename,
-                mime_type=self._get_mime_type(filename),
+                mime_type=mime_type,
                 size=os.path.getsize(storage_path),
                 storage_path=f"uploads/{collection.uuid}/{storage_filename}",
                 storage_backend='local',
@@ -184,6 +237,114 @@ class StorageService:
                 'storage_info': None
             }
 
+    def _r2_storage_key(self, collection: Collection, filename: str) -> str:
+        """Storage key for a file with collection context."""
+        return f"collections/{collection.uuid}/{filename}"
+
+    def create_direct_upload(self, filename: str, collection: Collection, content_type: str,
+                             expiry_seconds: int = 3600) -> Optional[Dict[str, any]]:
+        """
+        Presign a browser-to-R2 upload so the file bytes bypass this server.
+
+        Returns:
+            Dict with the storage key, URL, HTTP method and headers the client
+            must send, or None when the backend cannot accept direct uploads
+        """
+        if not (self.backend == 'r2' and self.r2_storage):
+            return None
+
+        storage_key = self._r2_storage_key(collection, filename)
+        url = self.r2_storage.generate_presigned_upload(
+            storage_key,
+            content_type,
+            expiry_seconds=expiry_seconds,
+            metadata={
+                'collection_id': str(collection.id),
+                'collection_uuid': str(collection.uuid),
+                'upload_method': 'presigned_put'
+            }
+        )
+
+        return {
+            'key': storage_key,
+            'url': url,
+            'method': 'PUT',
+            'headers': {
+                'Content-Type': content_type,
+                'x-amz-meta-collection_id': str(collection.id),
+                'x-amz-meta-collection_uuid': str(collection.uuid),
+                'x-amz-meta-upload_method': 'presigned_put'
+            }
+        }
+
+    def complete_direct_upload(self, filename: str, collection: Collection) -> Dict[str, any]:
+        """
+        Record a file the browser uploaded straight to R2.
+
+        The object is checked against the type and size limits because a
+        presigned PUT cannot enforce them; objects that fail are deleted.
+
+        Returns:
+            Dict in the same shape as upload_file
+        """
+        if not (self.backend == 'r2' and self.r2_storage):
+            return {'success': False, 'error': 'Direct uploads are not available',
+                    'file_record': None, 'storage_info': None}
+
+        storage_key = self._r2_storage_key(collection, filename)
+
+        # Completing the same upload again returns the existing record instead of a duplicate
+        existing = File.query.filter_by(collection_id=collection.id, storage_path=storage_key).first()
+        if existing is not None:
+            return {
+                'success': True,
+                'file_record': existing,
+                'error': None,
+                'storage_info': {'upload_method': 'presigned_put', 'key': storage_key,
+                                 'bucket': existing.get_metadata().get('r2_bucket'),
+                                 'size': existing.size}
+            }
+
+        info = self.r2_storage.get_file_info(storage_key)
+        if info is None:
+            return {'success': False, 'error': 'Uploaded file not found',
+                    'file_record': None, 'storage_info': None}
+
+        # The browser chose the Content-Type, so check the stored bytes too
+        max_size = current_app.config.get('MAX_FILE_SIZE', 50 * 1024 * 1024)
+        mime_type = None
+        if info['content_type'] in ALLOWED_MIME_TYPES and 0 < info['size'] <= max_size:
+            mime_type = sniff_image_mime_type(self.r2_storage.read_file_header(storage_key, MIME_SNIFF_BYTES))
+
+        if mime_type not in ALLOWED_MIME_TYPES:
+            self.r2_storage.delete_file(storage_key)
+            return {'success': False, 'error': 'File validation failed: unsupported type or size',
+                    'file_record': None, 'storage_info': None}
+
+        file_record = File(
+            filename=os.path.basename(storage_key),
+            original_filename=filename,
+            mime_type=mime_type,
+            size=info['size'],
+            storage_path=storage_key,
+            storage_backend='r2',
+            upload_complete=True,
+            collection_id=collection.id
+        )
+        file_record.set_metadata({
+            'upload_method': 'presigned_put',
+            'r2_bucket': info['bucket'],
+            'etag': info['etag']
+        })
+
+        return {
+            'success': True,
+            'file_record': file_record,
+            'error': None,
+            'storage_info': {'upload_method': 'presigned_put', 'key': storage_key,
+                             'bucket': info['bucket'], 'size': info['size']}
+        }
+
     def generate_file_url(self, file_record: File, expiry_seconds: int = 3600) -> str:
         """Generate a URL for file access."""
         if self.backend == 'r2' and self.r2_storage:
@@ -199,19 +360,23 @@ class StorageService:
     def delete_file(self, file_record: File) -> bool:
         """Delete file from storage."""
         try:
-            if self.backend == 'r2' and self.r2_storage:
-                return self.r2_storage.delete_file(file_record.storage_path)
-            else:
-                # Local file deletion
-                file_path = os.path.join(current_app.instance_path, file_record.storage_path)
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    return True
-                return False
+            return self.delete_path(file_record.storage_path)
         except Exception as e:
             logger.error(f"Failed to delete file {file_record.uuid}: {e}")
             return False
 
+    def delete_path(self, storage_path: str) -> bool:
+        """Delete the object at a storage path, returning False if there was none."""
+        if self.backend == 'r2' and self.r2_storage:
+            return self.r2_storage.delete_file(storage_path)
+
+        # Local file deletion
+        file_path = os.path.join(current_app.instance_path, storage_path)
+        if os.path.exists(file_path):
+            os.remove(file_path)
+            return True
+        return False
+
     def batch_upload(self, files_data: List[Dict], collection: Collection,
                     progress_callback: Optional[callable] = None) -> List[Dict]:
         """Upload multiple files with progress tracking."""
@@ -232,10 +397,11 @@ class StorageService:
                 file_obj = file_data['file_obj']
                 filename = file_data.get('filename')
 
-                # Individual file progress callback
-                def file_progress(uploaded, total):
-                    if progress_callback:
-                        progress_callback(completed_files, total_files, uploaded, total)
+                # Per-file progress binds the current count; without a callback the
+                # storage layer skips progress bookkeeping altogether
+                file_progress = (
+                    partial(progress_callback, completed_files, total_files) if progress_callback else None
+                )
 
                 result = self.upload_file(
                     file_obj=file_obj,
@@ -307,4 +473,56 @@ class StorageService:
     def _get_mime_type(self, filename: str) -> str:
         """Get MIME type from filename."""
         mime_type, _ = mimetypes.guess_type(filename)
-        return mime_type or 'application/octet-stream'
\ No newline at end of file
+        return mime_type or 'application/octet-stream'
+
+    def _detect_mime_type(self, file_obj: BinaryIO, filename: str) -> str:
+        """
+        Detect MIME type from the file's leading bytes.
+
+        Only a small header is read and the stream is rewound afterwards, so
+        this does not copy the upload. Falls back to the filename when the
+        content does not match a known image signature.
+        """
+        return self._sniff_mime_type(file_obj) or self._get_mime_type(filename)
+
+    def _sniff_mime_type(self, file_obj: BinaryIO) -> Optional[str]:
+        """Return the image MIME type from the file's leading bytes, or None if unknown."""
+        position = file_obj.tell()
+        header = file_obj.read(MIME_SNIFF_BYTES)
+        file_obj.seek(position)
+
+        return sniff_image_mime_type(header)
+
+
+def get_storage_service() -> StorageService:
+    """
+    Return the application's shared StorageService.
+
+    The instance lives in app.extensions and is rebuilt only when the storage
+    backend or R2 client configured on the app has changed.
+    """
+    app = current_app._get_current_object()
+    service = app.extensions.get('storage_service')
+
+    if (service is None
+            or service.backend != app.config.get('STORAGE_BACKEND', 'local')
+            or service.r2_storage is not getattr(app, 'r2_storage', None)):
+        service = StorageService()
+        app.extensions['storage_service'] = service
+
+    return service
+
+
+def sniff_image_mime_type(header: bytes) -> Optional[str]:
+    """Return the image MIME type matching a file header, or None if unknown."""
+    for offset, signature, mime_type in IMAGE_SIGNATURES:
+        if header.startswith(signature, offset):
+            return mime_type
+
+    if header.startswith(b'RIFF') and header[8:12] == b'WEBP':
+        return 'image/webp'
+
+    if header[4:8] == b'ftyp':
+        return HEIF_BRANDS.get(header[8:12])
+
+    return None
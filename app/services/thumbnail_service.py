@@ -12,10 +12,13 @@ import os
 import io
 import time
 import logging
+import threading
 import requests
+from concurrent.futures import Future
 from typing import Dict, Optional, Tuple, List
 from io import BytesIO
 from flask import current_app
+from sqlalchemy import bindparam, func, inspect, update
 
 try:
     from PIL import Image, ImageOps, ImageFilter
@@ -24,7 +27,8 @@ except ImportError:
     PIL_AVAILABLE = False
 
 from app.models import File, db
-from app.services.storage_service import StorageService
+from app.services.executors import get_app_executor
+from app.services.storage_service import get_storage_service
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +39,7 @@ THUMBNAIL_QUALITY = 75           # JPEG quality for thumbnails (1-100)
 MEDIUM_QUALITY = 85              # JPEG quality for medium previews (1-100)
 
 # Supported image formats
-SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.webp', '.tiff', '.bmp', '.gif'}
+SUPPORTED_FORMATS = frozenset({'.jpg', '.jpeg', '.png', '.webp', '.tiff', '.bmp', '.gif'})
 
 
 class ThumbnailService:
@@ -49,7 +53,7 @@ class ThumbnailService:
     }
 
     def __init__(self):
-        self.storage_service = StorageService()
+        self.storage_service = get_storage_service()
         self.r2_storage = getattr(current_app, 'r2_storage', None)
         self.backend = current_app.config.get('STORAGE_BACKEND', 'local')
 
@@ -77,7 +81,7 @@ class ThumbnailService:
             }
 
         if not file_record.is_image:
-            logger.info(f"Skipping variant generation for non-image: {file_record.uuid}")
+            logger.debug("Skipping variant generation for non-image: %s", file_record.uuid)
             return {
                 'success': False,
                 'error': 'Not an image file',
@@ -120,46 +124,24 @@ class ThumbnailService:
                     'file_uuid': str(file_record.uuid)
                 }
 
+            variant_paths, errors = self._create_variants(image, file_record.storage_path)
             variants_generated = []
-            errors = []
 
-            # Generate thumbnail variant
-            try:
-                thumb_data = self._generate_thumbnail_variant(image)
-                thumb_path = self._generate_variant_path(
-                    file_record.storage_path, 'thumb'
-                )
-                self._upload_variant(thumb_data, thumb_path)
-                file_record.thumb_path = thumb_path
+            if 'thumb_path' in variant_paths:
+                file_record.thumb_path = variant_paths['thumb_path']
                 variants_generated.append('thumbnail')
-                logger.debug(f"Generated thumbnail for {file_record.uuid}")
-            except Exception as e:
-                error_msg = f"Thumbnail generation failed: {str(e)}"
-                logger.error(f"{error_msg} for {file_record.uuid}")
-                errors.append(error_msg)
+                logger.debug("Generated thumbnail for %s", file_record.uuid)
 
-            # Generate medium preview variant
-            try:
-                medium_data = self._generate_medium_variant(image)
-                medium_path = self._generate_variant_path(
-                    file_record.storage_path, 'medium'
-                )
-                self._upload_variant(medium_data, medium_path)
-                file_record.medium_path = medium_path
+            if 'medium_path' in variant_paths:
+                file_record.medium_path = variant_paths['medium_path']
                 variants_generated.append('medium')
-                logger.debug(f"Generated medium preview for {file_record.uuid}")
-            except Exception as e:
-                error_msg = f"Medium variant generation failed: {str(e)}"
-                logger.error(f"{error_msg} for {file_record.uuid}")
-                errors.append(error_msg)
+                logger.debug("Generated medium preview for %s", file_record.uuid)
 
             # Commit database updates if any variants were generated
             if variants_generated:
                 try:
                     db.session.commit()
-                    logger.info(
-                        f"Generated variants for {file_record.uuid}: {', '.join(variants_generated)}"
-                    )
+                    logger.debug("Generated variants for %s: %s", file_record.uuid, variants_generated)
                 except Exception as e:
                     logger.error(f"Failed to commit variant paths for {file_record.uuid}: {e}")
                     db.session.rollback()
@@ -181,6 +163,58 @@ class ThumbnailService:
                 'file_uuid': str(file_record.uuid)
             }
 
+    def encode_variants(self, image_data: bytes, storage_path: str) -> Dict[str, any]:
+        """
+        Encode and store variants for an original image without touching the database.
+
+        Args:
+            image_data: Raw bytes of the original image
+            storage_path: Storage path of the original, used to place the variants
+
+        Returns:
+            Dict with:
+                - variant_paths: dict with 'thumb_path' and/or 'medium_path'
+                - errors: list of error messages (if any)
+        """
+        try:
+            image = Image.open(BytesIO(image_data))
+            image.load()  # Force load to catch truncated/corrupted images
+        except Exception as e:
+            logger.error(f"Failed to open image {storage_path}: {e}")
+            return {'variant_paths': {}, 'errors': ['Corrupted or invalid image file']}
+
+        variant_paths, errors = self._create_variants(image, storage_path)
+        return {'variant_paths': variant_paths, 'errors': errors}
+
+    def _create_variants(self, image: Image.Image, storage_path: str) -> Tuple[Dict[str, str], List[str]]:
+        """Generate and upload the thumbnail and medium variants of an opened image."""
+        variant_paths = {}
+        errors = []
+
+        # Generate thumbnail variant
+        try:
+            thumb_data = self._generate_thumbnail_variant(image)
+            thumb_path = self._generate_variant_path(storage_path, 'thumb')
+            self._upload_variant(thumb_data, thumb_path)
+            variant_paths['thumb_path'] = thumb_path
+        except Exception as e:
+            error_msg = f"Thumbnail generation failed: {str(e)}"
+            logger.error(f"{error_msg} for {storage_path}")
+            errors.append(error_msg)
+
+        # Generate medium preview variant
+        try:
+            medium_data = self._generate_medium_variant(image)
+            medium_path = self._generate_variant_path(storage_path, 'medium')
+            self._upload_variant(medium_data, medium_path)
+            variant_paths['medium_path'] = medium_path
+        except Exception as e:
+            error_msg = f"Medium variant generation failed: {str(e)}"
+            logger.error(f"{error_msg} for {storage_path}")
+            errors.append(error_msg)
+
+        return variant_paths, errors
+
     def _generate_thumbnail_variant(self, image: Image.Image) -> BytesIO:
         """Generate small thumbnail for grid display (square, cropped)."""
         return self._resize_image(
@@ -395,7 +429,7 @@ class ThumbnailService:
 
         # Only generate thumbnails for image files
         if not file_record.mime_type.startswith('image/'):
-            logger.info(f"Skipping thumbnail generation for non-image file: {file_record.mime_type}")
+            logger.debug("Skipping thumbnail generation for non-image file: %s", file_record.mime_type)
             return None
 
         try:
@@ -544,4 +578,218 @@ class ThumbnailService:
                 logger.error(f"Failed to update database with thumbnail paths: {e}")
                 db.session.rollback()
 
-        return results
\ No newline at end of file
+        return results
+
+
+# Ids of files with a variant job waiting or running on the variant pool
+_queued_file_ids = set()
+_queued_lock = threading.Lock()
+
+
+def enqueue_variant_generation(file_ids: List[int]) -> None:
+    """
+    Queue thumbnail and medium variant generation for the given File ids.
+
+    Jobs run on the application's background variant pool, each in its own
+    app context and database session, so the caller returns immediately.
+    A file that is already queued is skipped. With VARIANT_WORKERS set to 0
+    the variants are generated inline instead.
+    """
+    app = current_app._get_current_object()
+    max_workers = app.config.get('VARIANT_WORKERS', 3)
+
+    if not max_workers:
+        for file_id in file_ids:
+            _generate_variants_for(file_id)
+        return
+
+    # Files already waiting for a worker are not queued twice
+    with _queued_lock:
+        file_ids = [file_id for file_id in file_ids if file_id not in _queued_file_ids]
+        _queued_file_ids.update(file_ids)
+
+    variant_pool = get_app_executor(app, 'variant_pool', max_workers)
+    for file_id in file_ids:
+        variant_pool.submit(_run_variant_job, app, file_id)
+
+    logger.info("Queued variant generation for %d files", len(file_ids))
+
+
+class VariantPipeline:
+    """
+    Encodes image variants while the rest of a request's files are uploading.
+
+    submit() is called as each upload finishes and starts encoding from the
+    received bytes straight away, so encoding file j overlaps with uploading
+    file j+1 and the original never has to be downloaded again. Variant
+    paths can only be saved once the File rows exist, so the request calls
+    record_paths() after its commit. Encodes already finished by then are
+    saved in one bulk UPDATE; the rest are saved as each one finishes. If
+    the rows are never committed, discard() deletes the stored variants
+    instead. With VARIANT_WORKERS set to 0 everything runs inline.
+    """
+
+    def __init__(self):
+        self.app = current_app._get_current_object()
+        self.max_workers = self.app.config.get('VARIANT_WORKERS', 3)
+        self._jobs = []
+        self._discarded = False
+        self._lock = threading.Lock()
+
+    def submit(self, file_record: File, file_obj) -> None:
+        """
+        Start encoding variants for an uploaded file.
+
+        Takes ownership of file_obj and closes it once it has been read.
+        Safe to call from upload worker threads.
+        """
+        storage_path = file_record.storage_path
+
+        if self.max_workers:
+            variant_pool = get_app_executor(self.app, 'variant_pool', self.max_workers)
+            future = variant_pool.submit(self._encode, storage_path, file_obj)
+        else:
+            future = Future()
+            future.set_result(self._encode(storage_path, file_obj))
+
+        with self._lock:
+            if not self._discarded:
+                self._jobs.append((file_record, future))
+                return
+
+        # An upload that finished after the request gave up has no row to save to
+        self._delete_when_done(future)
+
+    def record_paths(self) -> None:
+        """Save variant paths on the committed File rows as each encode finishes."""
+        with self._lock:
+            jobs = list(self._jobs)
+            self._jobs.clear()
+
+        if not jobs:
+            return
+
+        # Encodes that are already done are saved together in one UPDATE
+        finished = {}
+        for file_record, future in jobs:
+            # Read the id from the identity map; file_record.id would reload the expired row
+            file_id = inspect(file_record).identity[0]
+            if future.done():
+                finished[file_id] = future.result()
+                continue
+
+            variant_pool = get_app_executor(self.app, 'variant_pool', self.max_workers)
+            future.add_done_callback(
+                lambda done, file_id=file_id: variant_pool.submit(
+                    _run_save_job, self.app, {file_id: done.result()}
+                )
+            )
+
+        logger.debug("%d/%d variant encodes finished before commit", len(finished), len(jobs))
+        _save_variant_paths(finished)
+
+    def discard(self) -> None:
+        """
+        Delete the variants of files whose rows were never committed.
+
+        Encodes still running are cleaned up as they finish, and so are any
+        submitted afterwards. Does nothing once record_paths() has taken the jobs.
+        """
+        with self._lock:
+            jobs = list(self._jobs)
+            self._jobs.clear()
+            self._discarded = True
+
+        for _, future in jobs:
+            self._delete_when_done(future)
+
+    def _delete_when_done(self, future: Future) -> None:
+        """Delete the variants an encode stores once it has finished."""
+        future.add_done_callback(lambda done: _delete_variant_files(self.app, done.result()))
+
+    def _encode(self, storage_path: str, file_obj) -> Dict[str, str]:
+        """Encode and store variants from an open upload, returning their paths."""
+        try:
+            with self.app.app_context():
+                file_obj.seek(0)
+                result = ThumbnailService().encode_variants(file_obj.read(), storage_path)
+            if result['errors']:
+                logger.warning("Variant encoding failed for %s: %s", storage_path, result['errors'])
+            return result['variant_paths']
+        except Exception as e:
+            logger.error("Variant encoding failed for %s: %s", storage_path, e)
+            return {}
+        finally:
+            file_obj.close()
+
+
+def _delete_variant_files(app, variant_paths: Dict[str, str]) -> None:
+    """Remove stored variants that no File row refers to."""
+    if not variant_paths:
+        return
+
+    with app.app_context():
+        storage_service = get_storage_service()
+        for storage_path in variant_paths.values():
+            try:
+                storage_service.delete_path(storage_path)
+            except Exception as e:
+                logger.error("Deleting orphaned variant %s failed: %s", storage_path, e)
+
+
+def _run_save_job(app, paths_by_id: Dict[int, Dict[str, str]]) -> None:
+    """Background entry point: save encoded variant paths in an app context."""
+    with app.app_context():
+        try:
+            _save_variant_paths(paths_by_id)
+        except Exception as e:
+            logger.error("Saving variant paths failed for files %s: %s", list(paths_by_id), e)
+            db.session.rollback()
+
+
+def _save_variant_paths(paths_by_id: Dict[int, Dict[str, str]]) -> None:
+    """Store encoded variant paths on File rows with a single bulk UPDATE."""
+    rows = [
+        {'file_id': file_id, 'thumb': paths.get('thumb_path'), 'medium': paths.get('medium_path')}
+        for file_id, paths in paths_by_id.items() if paths
+    ]
+    if not rows:
+        return
+
+    # Missing paths keep their current value; rows deleted meanwhile are skipped
+    files = File.__table__
+    statement = (
+        update(files)
+        .where(files.c.id == bindparam('file_id'))
+        .values(
+            thumb_path=func.coalesce(bindparam('thumb'), files.c.thumb_path),
+            medium_path=func.coalesce(bindparam('medium'), files.c.medium_path)
+        )
+    )
+    db.session.execute(statement, rows)
+    db.session.commit()
+    logger.debug("Saved variants for %d files", len(rows))
+
+
+def _run_variant_job(app, file_id: int) -> None:
+    """Background entry point: generate variants for one file in an app context."""
+    with app.app_context():
+        try:
+            _generate_variants_for(file_id)
+        except Exception as e:
+            logger.error("Background variant generation failed for file %s: %s", file_id, e)
+        finally:
+            with _queued_lock:
+                _queued_file_ids.discard(file_id)
+
+
+def _generate_variants_for(file_id: int) -> Optional[Dict[str, any]]:
+    """Load a File by id and generate its variants."""
+    file_record = db.session.get(File, file_id)
+    if file_record is None or not file_record.is_image:
+        return None
+
+    result = ThumbnailService().generate_all_variants(file_record)
+    if not result.get('success'):
+        logger.warning("Variant generation failed for file %s: %s", file_id, result.get('error'))
+    return result
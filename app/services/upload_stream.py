@@ -0,0 +1,122 @@
+"""
+Incremental parsing of multipart upload requests.
+
+Werkzeug's request.files parses and spools the entire request body before
+the view sees any of it. This module reads the body in chunks with
+Werkzeug's sans-IO multipart decoder instead, handing back each form field
+as soon as it is read and each file as soon as its part is complete. Only
+the file currently being received is spooled, so memory stays flat no
+matter how many files are in the request.
+
+Each file is spooled once rather than piped part by part into an R2
+multipart upload because validation and variant encoding both need the
+complete file. The spool is then sent with boto3's parallel multipart
+transfer while the next file is still being read. Clients that can use
+presigned PUTs (/collections/api/presign) skip this path entirely.
+"""
+
+import logging
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Iterator, Optional, Tuple, Union
+
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+logger = logging.getLogger(__name__)
+
+# Size of each read from the request body
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# File parts larger than this roll over from memory to a temporary file
+SPOOL_MAX_MEMORY = 500 * 1024  # 500KB, matching Werkzeug's default
+
+
+def iter_multipart_parts(
+    stream: BinaryIO,
+    boundary: bytes,
+    max_form_memory_size: Optional[int] = None,
+    chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Iterator[Tuple[str, Union[str, FileStorage]]]:
+    """
+    Yield (name, value) pairs from a multipart/form-data body as they arrive.
+
+    Form fields are yielded as strings. Files are yielded as FileStorage
+    objects rewound to the start, with content_length set to the number of
+    bytes received.
+
+    Args:
+        stream: Request body stream (e.g. request.stream)
+        boundary: Multipart boundary from the Content-Type header
+        max_form_memory_size: Maximum size of a single non-file field
+        chunk_size: Bytes read from the stream per iteration
+
+    Raises:
+        RequestEntityTooLarge: If a form field exceeds max_form_memory_size
+        ClientDisconnected: If the body ends before the closing boundary
+    """
+    decoder = MultipartDecoder(boundary, max_form_memory_size=max_form_memory_size)
+
+    part = None
+    field_chunks = []
+    field_size = 0
+    spool = None
+    file_size = 0
+    chunk = None
+
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            decoder.receive_data(chunk or None)
+
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, Field):
+                    part = event
+                    field_chunks = []
+                    field_size = 0
+                elif isinstance(event, File):
+                    part = event
+                    spool = SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+                    file_size = 0
+                elif isinstance(event, Data):
+                    if isinstance(part, File):
+                        spool.write(event.data)
+                        file_size += len(event.data)
+                    else:
+                        field_size += len(event.data)
+                        if max_form_memory_size is not None and field_size > max_form_memory_size:
+                            raise RequestEntityTooLarge()
+                        field_chunks.append(event.data)
+
+                    if not event.more_data:
+                        if isinstance(part, File):
+                            # The FileStorage owns the spool from here on
+                            received, spool = spool, None
+                            received.seek(0)
+                            yield part.name, FileStorage(
+                                received,
+                                filename=part.filename,
+                                name=part.name,
+                                headers=part.headers,
+                                content_length=file_size
+                            )
+                        else:
+                            yield part.name, b''.join(field_chunks).decode('utf-8', 'replace')
+
+                event = decoder.next_event()
+
+            if isinstance(event, Epilogue):
+                return
+            if not chunk:
+                # A truncated body would otherwise pass for a complete upload
+                raise ClientDisconnected()
+    except ValueError:
+        # The decoder rejects a body that ends part way through a part
+        if chunk:
+            raise
+        raise ClientDisconnected()
+    finally:
+        # A file cut off part way through was never handed out, so close it here
+        if spool is not None:
+            spool.close()
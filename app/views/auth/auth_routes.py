@@ -2,10 +2,11 @@
 Authentication routes for The Open Harbor application.
 """
 
-from flask import render_template, redirect, url_for, flash, request
+from flask import render_template, redirect, url_for, flash, request, current_app
 from flask_login import login_user, logout_user, current_user, login_required
 from app.forms import LoginForm, SignUpForm
-from app.models import db, User
+from app.models import db, User, hash_password
+from werkzeug.security import check_password_hash
 from datetime import datetime, timezone
 import logging
 
@@ -15,6 +16,19 @@ from . import auth as bp
 logger = logging.getLogger(__name__)
 
 
+def _dummy_password_hash():
+    """
+    Return the hash checked against when the email is unknown, so failed logins
+    cost the same hashing work whether or not the account exists. It is made
+    once per application with the same method as real password hashes.
+    """
+    dummy_hash = current_app.extensions.get('auth_dummy_password_hash')
+    if dummy_hash is None:
+        dummy_hash = current_app.extensions['auth_dummy_password_hash'] = \
+            hash_password('the-open-harbor-dummy-password')
+    return dummy_hash
+
+
 @bp.route('/sign-up', methods=['GET', 'POST'])
 def signup():
     """Handle user registration."""
@@ -40,7 +54,7 @@ def signup():
             db.session.commit()
 
             flash('Welcome to The Open Harbor! Your account has been created.', 'success')
-            logger.info(f"New user registered: {user.email}")
+            logger.info("New user registered: %s", user.email)
 
             # Redirect to intended page or home
             next_page = request.args.get('next')
@@ -50,11 +64,11 @@ def signup():
 
         except ValueError as e:
             flash(str(e), 'error')
-            logger.warning(f"Registration failed for {form.email.data}: {str(e)}")
+            logger.warning("Registration failed for %s: %s", form.email.data, e)
         except Exception as e:
             db.session.rollback()
             flash('An error occurred during registration. Please try again.', 'error')
-            logger.error(f"Registration error for {form.email.data}: {str(e)}")
+            logger.error("Registration error for %s: %s", form.email.data, e)
 
     return render_template('auth/signup.html', form=form)
 
@@ -73,11 +87,17 @@ def login():
             # Find user by email
             user = User.query.filter_by(email=form.email.data.lower().strip()).first()
 
-            # Check credentials
-            if user and user.check_password(form.password.data):
+            # Check credentials, hashing even for unknown emails to avoid
+            # leaking which accounts exist through response timing
+            if user:
+                password_ok = user.check_password(form.password.data)
+            else:
+                password_ok = check_password_hash(_dummy_password_hash(), form.password.data)
+
+            if user and password_ok:
                 if not user.is_active:
                     flash('Your account has been deactivated. Please contact support.', 'error')
-                    logger.warning(f"Inactive user attempted login: {user.email}")
+                    logger.warning("Inactive user attempted login: %s", user.email)
                     return render_template('auth/login.html', form=form)
 
                 # Log the user in
@@ -86,7 +106,7 @@ def login():
                 db.session.commit()
 
                 flash(f'Welcome back!', 'success')
-                logger.info(f"User logged in: {user.email}")
+                logger.info("User logged in: %s", user.email)
 
                 # Redirect to intended page or home
                 next_page = request.args.get('next')
@@ -95,11 +115,11 @@ def login():
                 return redirect(url_for('main.home'))
             else:
                 flash('Invalid email or password. Please try again.', 'error')
-                logger.warning(f"Failed login attempt for: {form.email.data}")
+                logger.warning("Failed login attempt for: %s", form.email.data)
 
         except Exception as e:
             flash('An error occurred during login. Please try again.', 'error')
-            logger.error(f"Login error for {form.email.data}: {str(e)}")
+            logger.error("Login error for %s: %s", form.email.data, e)
 
     return render_template('auth/login.html', form=form)
 
@@ -108,10 +128,11 @@ def login():
 @login_required
 def logout():
     """Handle user logout."""
-    user_email = current_user.email if current_user.is_authenticated else "Unknown"
+    # login_required has already resolved the user, so this is a plain attribute read
+    user_email = current_user.email
     logout_user()
     flash('You have been logged out successfully.', 'info')
-    logger.info(f"User logged out: {user_email}")
+    logger.info("User logged out: %s", user_email)
     return redirect(url_for('main.home'))
 
 
@@ -2,14 +2,84 @@
 Routes for collection management including upload functionality.
 """
 
-from flask import render_template, request, redirect, url_for, flash, jsonify, current_app, session, abort, send_file
+from flask import render_template, request, redirect, url_for, flash, jsonify, current_app, session, abort, send_file, make_response, stream_template, g
 from flask_login import login_required, current_user
+from sqlalchemy import and_
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
 from datetime import datetime, timedelta, timezone
+import hashlib
+import logging
 import os
+from urllib.parse import quote
 
 from app.views.collections import collections
 from app.models import db, Collection, File, User
 from app.forms import CollectionForm
+from app.integrations.file_storage import ALLOWED_MIME_TYPES, ValidationError
+from app.services.storage_service import get_storage_service
+from app.services.thumbnail_service import ThumbnailService, VariantPipeline, enqueue_variant_generation
+from app.services.upload_stream import iter_multipart_parts
+
+logger = logging.getLogger(__name__)
+
+# Collection lifetimes offered by CollectionForm.expiration
+EXPIRATION_DELTAS = {
+    '1_week': timedelta(weeks=1),
+    '1_month': timedelta(days=30),
+    '3_months': timedelta(days=90),
+    '1_year': timedelta(days=365)
+}
+
+UNSUPPORTED_TYPE_ERROR = 'Unsupported file type. Use JPG, PNG, HEIC, TIFF, or RAW files.'
+FILE_TOO_LARGE_ERROR = 'File too large. Maximum size is 50MB per file.'
+
+# Shown by serve_thumbnail while a file's thumbnail is being generated
+THUMBNAIL_PLACEHOLDER = os.path.join('img', 'thumbnail-placeholder.svg')
+
+# Largest validate-files request body; 100 entries with long names fit easily
+VALIDATE_MAX_BODY = 256 * 1024
+
+# Seconds a browser may reuse a file, thumbnail or preview response. Presigned
+# URLs live twice as long: PresignedUrlCache hands a URL out for at most half its
+# lifetime, so a redirect cached for VARIANT_MAX_AGE expires before its URL does
+VARIANT_MAX_AGE = 3600
+VARIANT_URL_EXPIRY = 2 * VARIANT_MAX_AGE
+
+
+def _collection_etag(collections):
+    """Build a weak ETag for pages rendered from the given collections."""
+    viewer = current_user.get_id() if current_user.is_authenticated else 'anonymous'
+    parts = [viewer]
+    for collection in collections:
+        updated = collection.updated_at.timestamp() if collection.updated_at else 0
+        parts.append(f"{collection.id}:{updated}:{len(collection.files)}")
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def _render_conditional(etag, template, stream=False, **context):
+    """
+    Render a template, answering 304 if the client already has this version.
+
+    With stream=True the page is sent as it renders instead of being
+    buffered in full first.
+    """
+    render = stream_template if stream else render_template
+
+    # Pending flash messages change the page without changing the ETag
+    if session.get('_flashes'):
+        return make_response(render(template, **context))
+
+    if request.if_none_match.contains_weak(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(render(template, **context))
+
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 
 @collections.route('/upload', methods=['GET', 'POST'])
@@ -32,15 +102,9 @@ def upload():
             collection.set_password(form.password.data)
 
         # Handle expiration
-        if form.expiration.data:
-            if form.expiration.data == '1_week':
-                collection.expires_at = datetime.now(timezone.utc) + timedelta(weeks=1)
-            elif form.expiration.data == '1_month':
-                collection.expires_at = datetime.now(timezone.utc) + timedelta(days=30)
-            elif form.expiration.data == '3_months':
-                collection.expires_at = datetime.now(timezone.utc) + timedelta(days=90)
-            elif form.expiration.data == '1_year':
-                collection.expires_at = datetime.now(timezone.utc) + timedelta(days=365)
+        expires_in = EXPIRATION_DELTAS.get(form.expiration.data)
+        if expires_in:
+            collection.expires_at = datetime.now(timezone.utc) + expires_in
 
         try:
             db.session.add(collection)
@@ -55,7 +119,7 @@ def upload():
         except Exception as e:
             db.session.rollback()
             flash('Error creating collection. Please try again.', 'error')
-            current_app.logger.error(f"Collection creation error: {str(e)}")
+            logger.error("Collection creation error: %s", e)
 
             # Return JSON error for AJAX requests
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -69,17 +133,12 @@ def upload():
 def validate_files():
     """API endpoint to validate uploaded files."""
     try:
+        # The JSON is parsed in one go, so refuse bodies far larger than a full batch
+        request.max_content_length = VALIDATE_MAX_BODY
         files = request.get_json().get('files', [])
         valid_files = []
         errors = []
 
-        # File type validation
-        ALLOWED_TYPES = [
-            'image/jpeg', 'image/jpg', 'image/png',
-            'image/heic', 'image/heif', 'image/tiff',
-            'image/webp', 'image/x-adobe-dng'
-        ]
-
         MAX_FILE_SIZE = current_app.config.get('MAX_FILE_SIZE', 50 * 1024 * 1024)
         MAX_TOTAL_SIZE = current_app.config.get('MAX_TOTAL_SIZE', 10 * 1024 * 1024 * 1024)
         MAX_BATCH_FILES = current_app.config.get('MAX_BATCH_FILES', 100)
@@ -91,36 +150,34 @@ def validate_files():
                 'error': f'Too many files. Maximum {MAX_BATCH_FILES} files per batch.'
             }), 400
 
-        total_size = 0
+        # Reject oversized batches before validating individual files
+        total_size = sum(file_info.get('size', 0) for file_info in files)
+        if total_size > MAX_TOTAL_SIZE:
+            return jsonify({
+                'success': False,
+                'error': 'Total upload size too large. Maximum 10GB per collection.'
+            }), 400
 
         for file_info in files:
-            file_errors = []
-
-            # Validate file type
-            if file_info.get('type') not in ALLOWED_TYPES:
-                file_errors.append('Unsupported file type. Use JPG, PNG, HEIC, TIFF, or RAW files.')
-
-            # Validate file size
             file_size = file_info.get('size', 0)
-            if file_size > MAX_FILE_SIZE:
-                file_errors.append('File too large. Maximum size is 50MB per file.')
+            bad_type = file_info.get('type') not in ALLOWED_MIME_TYPES
+            too_large = file_size > MAX_FILE_SIZE
 
-            total_size += file_size
-
-            if file_errors:
-                errors.append({
-                    'filename': file_info.get('name', 'Unknown'),
-                    'errors': file_errors
-                })
-            else:
+            if not (bad_type or too_large):
                 valid_files.append(file_info)
+                continue
 
-        # Check total size
-        if total_size > MAX_TOTAL_SIZE:
-            return jsonify({
-                'success': False,
-                'error': 'Total upload size too large. Maximum 10GB per collection.'
-            }), 400
+            # Only build the error list for files that actually failed
+            file_errors = []
+            if bad_type:
+                file_errors.append(UNSUPPORTED_TYPE_ERROR)
+            if too_large:
+                file_errors.append(FILE_TOO_LARGE_ERROR)
+
+            errors.append({
+                'filename': file_info.get('name', 'Unknown'),
+                'errors': file_errors
+            })
 
         if errors:
             return jsonify({
@@ -135,131 +192,153 @@ def validate_files():
             'total_size': total_size
         })
 
+    except RequestEntityTooLarge:
+        return jsonify({
+            'success': False,
+            'error': 'Validation request too large.'
+        }), 413
+
     except Exception as e:
-        current_app.logger.error(f"File validation error: {str(e)}")
+        logger.error("File validation error: %s", e)
         return jsonify({
             'success': False,
             'error': 'Server error during file validation'
         }), 500
 
 
+def _iter_upload_parts():
+    """Yield (name, value) pairs from the upload request body as they arrive."""
+    boundary = request.mimetype_params.get('boundary')
+    if request.mimetype != 'multipart/form-data' or not boundary:
+        # URL-encoded bodies carry no files and are small enough to parse at once
+        yield from request.form.items(multi=True)
+        return
+
+    yield from iter_multipart_parts(
+        request.stream,
+        boundary.encode('latin-1'),
+        max_form_memory_size=current_app.config.get('MAX_FORM_MEMORY_SIZE')
+    )
+
+
 @collections.route('/api/upload-files', methods=['POST'])
 @login_required
 def upload_files():
     """API endpoint to handle file uploads with R2 integration."""
+    variant_pipeline = VariantPipeline()
+    pending_files = []
+    upload_futures = []
+    saved = False
     try:
-        collection_id = request.form.get('collection_id')
-        if not collection_id:
-            return jsonify({'success': False, 'error': 'Collection ID required'}), 400
-
-        # Verify collection ownership
-        collection = Collection.query.filter_by(
-            id=collection_id,
-            user_id=current_user.id
-        ).first()
-
-        if not collection:
-            return jsonify({'success': False, 'error': 'Collection not found'}), 404
-
-        from app.services.storage_service import StorageService
-        storage_service = StorageService()
+        storage_service = get_storage_service()
+        collection = None
         uploaded_files = []
         upload_errors = []
 
-        def progress_callback(file_key, bytes_uploaded, total_bytes):
-            """Progress callback for individual file uploads."""
-            # This could be extended to use WebSocket for real-time updates
-            # Note: Logging removed to avoid Flask application context issues
-            pass
+        def store_file(file):
+            """Hand one received file to the upload pool."""
+            logger.debug("Attempting upload: %s backend=%s", file.filename, storage_service.backend)
 
-        for file_key in request.files:
-            file = request.files[file_key]
-            if file and file.filename:
+            def on_complete(result):
+                """Start encoding variants of an uploaded image; otherwise release the file."""
                 try:
-                    # Create progress callback for this specific file
-                    file_progress = lambda uploaded, total: progress_callback(
-                        file.filename, uploaded, total
-                    )
-
-                    # Reset file stream position
-                    file.stream.seek(0)
-
-                    current_app.logger.info(
-                        f"Attempting upload: {file.filename}, size: {file.stream.seek(0, 2)}, backend: {storage_service.backend}"
-                    )
-                    file.stream.seek(0)
-
-                    # Upload file using storage service
-                    result = storage_service.upload_file(
-                        file_obj=file.stream,
-                        filename=file.filename,
-                        collection=collection,
-                        progress_callback=file_progress
-                    )
-
-                    current_app.logger.info(f"Upload result for {file.filename}: {result}")
-
-                    if result['success']:
-                        db.session.add(result['file_record'])
-                        uploaded_files.append({
-                            'filename': file.filename,
-                            'size': result['file_record'].size,
-                            'uuid': result['file_record'].uuid,
-                            'storage_info': result['storage_info']
-                        })
-                    else:
-                        upload_errors.append({
-                            'filename': file.filename,
-                            'error': result['error']
-                        })
-
+                    if result['success'] and result['file_record'].is_image:
+                        variant_pipeline.submit(result['file_record'], file.stream)
+                        return
                 except Exception as e:
-                    upload_errors.append({
-                        'filename': file.filename,
-                        'error': str(e)
-                    })
+                    logger.error("Variant generation error: %s", e)
+                file.close()
+
+            # Upload runs in the background while the next file is received
+            future = storage_service.submit_upload(
+                file_obj=file.stream,
+                filename=file.filename,
+                collection=collection,
+                on_complete=on_complete
+            )
+            upload_futures.append((file.filename, future))
+
+        # Files are uploaded as soon as their part of the body has arrived
+        for field_name, value in _iter_upload_parts():
+            if isinstance(value, FileStorage):
+                if not value.filename:
+                    value.close()
+                elif collection is None:
+                    # Hold files sent ahead of collection_id until it is known
+                    pending_files.append(value)
+                else:
+                    store_file(value)
+                continue
 
-        # Commit successful uploads to database
-        if uploaded_files:
+            if field_name != 'collection_id' or collection is not None or not value:
+                continue
+
+            # Verify collection ownership
+            collection = Collection.query.filter_by(
+                id=value,
+                user_id=current_user.id
+            ).first()
+
+            if not collection:
+                return jsonify({'success': False, 'error': 'Collection not found'}), 404
+
+            for file in pending_files:
+                store_file(file)
+            pending_files.clear()
+
+        if collection is None:
+            return jsonify({'success': False, 'error': 'Collection ID required'}), 400
+
+        # Collect results in submission order so the response is deterministic
+        file_records = []
+        for filename, future in upload_futures:
             try:
-                db.session.commit()
-                current_app.logger.info(
-                    f"Uploaded {len(uploaded_files)} files to collection {collection_id}"
-                )
+                result = future.result()
+            except Exception as e:
+                upload_errors.append({'filename': filename, 'error': str(e)})
+                continue
 
-                # Generate image variants after successful upload
-                # Note: This is non-blocking and won't fail the upload if it errors
-                try:
-                    from app.services.thumbnail_service import ThumbnailService
+            logger.debug("Upload result for %s: success=%s", filename, result['success'])
 
-                    # Get file records for uploaded files
-                    file_records = [
-                        File.query.filter_by(uuid=f['uuid']).first()
-                        for f in uploaded_files
-                    ]
+            if result['success']:
+                file_records.append(result['file_record'])
+                uploaded_files.append({
+                    'filename': filename,
+                    'size': result['file_record'].size,
+                    'storage_info': result['storage_info']
+                })
+            else:
+                upload_errors.append({
+                    'filename': filename,
+                    'error': result['error']
+                })
 
-                    # Filter to only image files
-                    image_files = [f for f in file_records if f and f.is_image]
+        # Commit successful uploads to database
+        if uploaded_files:
+            try:
+                db.session.add_all(file_records)
 
-                    if image_files:
-                        thumbnail_service = ThumbnailService()
+                # Flush assigns uuids while the records are still loaded, so
+                # nothing has to be queried back after the commit expires them
+                db.session.flush()
+                for uploaded, file_record in zip(uploaded_files, file_records):
+                    uploaded['uuid'] = file_record.uuid
 
-                        # Generate all variants (thumb + medium) in batch
-                        variant_results = thumbnail_service.batch_generate_variants(
-                            image_files,
-                            max_workers=3  # Limit concurrency for CPU-bound work
-                        )
+                db.session.commit()
+                saved = True
+                logger.info("Uploaded %d files to collection %s", len(uploaded_files), collection.id)
 
-                        current_app.logger.info(
-                            f"Variant generation: {variant_results['successful']}/{variant_results['total']} successful"
-                        )
+                # Variants were encoded alongside the uploads; save their paths
+                # as they finish. Thumbnails fall back to on-demand generation meanwhile
+                try:
+                    variant_pipeline.record_paths()
                 except Exception as e:
-                    # Don't fail the upload if variant generation fails
-                    current_app.logger.error(f"Variant generation error: {str(e)}")
+                    # Don't fail the upload if variant generation can't be queued
+                    logger.error("Variant generation error: %s", e)
 
             except Exception as e:
                 db.session.rollback()
-                current_app.logger.error(f"Database commit failed: {str(e)}")
+                logger.error("Database commit failed: %s", e)
                 return jsonify({
                     'success': False,
                     'error': 'Database error: Could not save file records'
@@ -295,9 +374,162 @@ def upload_files():
             # All files succeeded
             return jsonify(response_data), 200
 
+    except (RequestEntityTooLarge, ClientDisconnected):
+        db.session.rollback()
+        raise
+
+    except Exception as e:
+        db.session.rollback()
+        logger.error("File upload error: %s", e)
+        return jsonify({
+            'success': False,
+            'error': 'Server error during upload'
+        }), 500
+
+    finally:
+        for file in pending_files:
+            file.close()
+        if not saved:
+            _discard_uploads(upload_futures)
+        # After a successful commit record_paths() has taken every job, so this
+        # only deletes variants of files whose rows were never saved
+        variant_pipeline.discard()
+
+
+def _discard_uploads(upload_futures):
+    """Wait for uploads whose rows were never saved and delete what they stored."""
+    if not upload_futures:
+        return
+
+    storage_service = get_storage_service()
+    for filename, future in upload_futures:
+        try:
+            result = future.result()
+        except Exception:
+            # A failed upload stored nothing
+            continue
+
+        if not result['success']:
+            continue
+
+        try:
+            storage_service.delete_path(result['file_record'].storage_path)
+        except Exception as e:
+            logger.error("Deleting orphaned upload %s failed: %s", filename, e)
+
+
+@collections.route('/api/presign', methods=['POST'])
+@login_required
+def presign_upload():
+    """API endpoint returning a presigned URL so the browser uploads straight to R2."""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename')
+        content_type = data.get('content_type')
+
+        if not filename:
+            return jsonify({'success': False, 'error': 'Filename required'}), 400
+
+        # Cheap request checks run before the collection lookup
+        if content_type not in ALLOWED_MIME_TYPES:
+            return jsonify({'success': False, 'error': UNSUPPORTED_TYPE_ERROR}), 400
+
+        size = data.get('size', 0)
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            return jsonify({'success': False, 'error': 'Invalid file size'}), 400
+
+        if size > current_app.config.get('MAX_FILE_SIZE', 50 * 1024 * 1024):
+            return jsonify({'success': False, 'error': FILE_TOO_LARGE_ERROR}), 400
+
+        collection = Collection.query.filter_by(
+            id=data.get('collection_id'),
+            user_id=current_user.id
+        ).first()
+
+        if not collection:
+            return jsonify({'success': False, 'error': 'Collection not found'}), 404
+
+        upload = get_storage_service().create_direct_upload(filename, collection, content_type)
+
+        if upload is None:
+            # Local storage: the client falls back to /api/upload-files
+            return jsonify({
+                'success': False,
+                'direct_upload': False,
+                'error': 'Direct uploads are not available'
+            }), 400
+
+        return jsonify({'success': True, 'direct_upload': True, 'upload': upload})
+
+    except ValidationError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+    except Exception as e:
+        logger.error("Presign error: %s", e)
+        return jsonify({
+            'success': False,
+            'error': 'Server error while preparing upload'
+        }), 500
+
+
+@collections.route('/api/complete-upload', methods=['POST'])
+@login_required
+def complete_upload():
+    """API endpoint recording a file the browser uploaded directly to R2."""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename')
+
+        if not filename:
+            return jsonify({'success': False, 'error': 'Filename required'}), 400
+
+        collection = Collection.query.filter_by(
+            id=data.get('collection_id'),
+            user_id=current_user.id
+        ).first()
+
+        if not collection:
+            return jsonify({'success': False, 'error': 'Collection not found'}), 404
+
+        result = get_storage_service().complete_direct_upload(filename, collection)
+
+        if not result['success']:
+            return jsonify({
+                'success': False,
+                'uploaded_files': [],
+                'errors': [{'filename': filename, 'error': result['error']}]
+            }), 400
+
+        file_record = result['file_record']
+
+        # A retried completion gets the row recorded the first time back
+        if file_record.id is None:
+            db.session.add(file_record)
+            db.session.commit()
+            logger.info("Recorded direct upload %s in collection %s", file_record.uuid, collection.id)
+
+            if file_record.is_image:
+                try:
+                    enqueue_variant_generation([file_record.id])
+                except Exception as e:
+                    # Don't fail the upload if variant generation can't be queued
+                    logger.error("Variant generation error: %s", e)
+
+        return jsonify({
+            'success': True,
+            'uploaded_files': [{
+                'filename': filename,
+                'size': file_record.size,
+                'uuid': file_record.uuid,
+                'storage_info': result['storage_info']
+            }],
+            'errors': [],
+            'collection_url': url_for('collections.view', uuid=collection.uuid)
+        })
+
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"File upload error: {str(e)}")
+        logger.error("Complete upload error: %s", e)
         return jsonify({
             'success': False,
             'error': 'Server error during upload'
@@ -307,153 +539,258 @@ def upload_files():
 @collections.route('/<uuid:uuid>')
 def view(uuid):
     """View a collection."""
-    collection = Collection.query.filter_by(uuid=str(uuid)).first_or_404()
-    return render_template('collections/view.html', collection=collection)
+    collection = g.collection
+    return _render_conditional(
+        _collection_etag([collection]), 'collections/view.html', collection=collection
+    )
 
 
 @collections.route('/')
 @login_required
 def index():
     """List user's collections."""
-    collections = Collection.query.filter_by(user_id=current_user.id).order_by(Collection.created_at.desc()).all()
-    return render_template('collections/index.html', collections=collections)
-
-
-@collections.route('/files/<uuid:file_uuid>')
-def serve_file(file_uuid):
-    """Serve file through presigned URL or direct serving."""
-    file_record = File.query.filter_by(uuid=str(file_uuid)).first_or_404()
+    collections = (
+        Collection.query.options(selectinload(Collection.files))
+        .filter_by(user_id=current_user.id)
+        .order_by(Collection.created_at.desc())
+        .all()
+    )
+    return _render_conditional(
+        _collection_etag(collections), 'collections/index.html',
+        stream=True, collections=collections
+    )
+
+
+def _send_local_file(relative_path, mimetype, download_name=None, etag=True):
+    """
+    Send a file stored under the instance folder.
+
+    With X_ACCEL_REDIRECT_PREFIX set, nginx streams the body from its internal
+    location and this worker only returns headers. Otherwise send_file is
+    used, which also honours USE_X_SENDFILE and answers Range and
+    If-None-Match requests so interrupted downloads can resume.
+
+    Raises FileNotFoundError when the file is missing, so callers need no
+    separate existence check.
+    """
+    accel_prefix = current_app.config.get('X_ACCEL_REDIRECT_PREFIX')
+    if not accel_prefix:
+        # send_file's own stat is the only one made; ENOENT surfaces from it
+        response = send_file(
+            os.path.join(current_app.instance_path, relative_path),
+            mimetype=mimetype,
+            as_attachment=download_name is not None,
+            download_name=download_name,
+            conditional=etag is True,
+            etag=etag is True,
+            # Uploads may be private; only _cache_file_response decides their caching
+            max_age=0
+        )
+        if etag is not True:
+            response.set_etag(f"{etag}-{int(response.last_modified.timestamp())}")
+            response.make_conditional(request, accept_ranges=True, complete_length=response.content_length)
+        return response
 
-    # Check access permissions
-    collection = file_record.collection
+    response = make_response('')
+    response.mimetype = mimetype
+    response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(relative_path)}"
 
-    # Handle password-protected collections
-    if collection.privacy == 'password':
+    if download_name is not None:
+        try:
+            download_name.encode('ascii')
+            names = {'filename': download_name}
+        except UnicodeEncodeError:
+            names = {
+                'filename': download_name.encode('ascii', 'ignore').decode('ascii'),
+                'filename*': f"UTF-8''{quote(download_name)}"
+            }
+        response.headers.set('Content-Disposition', 'attachment', **names)
+
+    return response
+
+
+def _cache_file_response(response):
+    """
+    Let browsers reuse a file, thumbnail or preview response for VARIANT_MAX_AGE.
+
+    Files in public collections may also be kept by shared caches; all other
+    responses are private because access depends on the visitor's session.
+    Redirects to a presigned URL are neither immutable nor given an ETag: a
+    variant can be regenerated under the same route, and once max-age runs
+    out the browser fetches a fresh redirect instead of keeping an expired URL.
+    """
+    collection = g.file_record.collection
+    response.cache_control.no_cache = None
+    if collection.privacy == 'public' and collection.expires_at is None:
+        response.cache_control.private = None
+        response.cache_control.public = True
+    else:
+        response.cache_control.public = None
+        response.cache_control.private = True
+    response.cache_control.max_age = VARIANT_MAX_AGE
+    response.expires = None
+    return response
+
+
+@collections.before_request
+def _resolve_file_access():
+    """
+    Load the collection or file a public route is for and enforce access once.
+
+    Serves the collection page and every /files/<file_uuid> route. The
+    record, its collection and the expiry check come back in one query and
+    are kept on g.collection or g.file_record for the view.
+    """
+    view_args = request.view_args or {}
+
+    # Stored timestamps are naive UTC, so compare against a naive UTC bound value
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    is_expired = and_(Collection.expires_at.is_not(None), Collection.expires_at <= now)
+
+    if request.endpoint == 'collections.view':
+        row = (
+            db.session.query(Collection, is_expired)
+            .options(joinedload(Collection.files))
+            .filter(Collection.uuid == view_args['uuid'])
+            .first()
+        )
+        if row is None:
+            abort(404)
+        g.collection, expired = row
+        return _check_collection_access(g.collection, expired)
+
+    file_uuid = view_args.get('file_uuid')
+    if file_uuid is None:
+        return None
+
+    row = (
+        db.session.query(File, is_expired)
+        .join(File.collection)
+        .options(contains_eager(File.collection))
+        .filter(File.uuid == file_uuid)
+        .first()
+    )
+    if row is None:
+        abort(404)
+    g.file_record, expired = row
+    return _check_collection_access(g.file_record.collection, expired)
+
+
+def _check_collection_access(collection, expired):
+    """Redirect to the password form or abort if the collection may not be shown."""
+    is_owner = current_user.is_authenticated and current_user.id == collection.user_id
+
+    # Handle password-protected collections (owners never need the password)
+    if collection.privacy == 'password' and not is_owner:
         # Check if password was provided in session
         session_key = f'collection_access_{collection.uuid}'
         if session_key not in session:
             return redirect(url_for('collections.password_required', uuid=collection.uuid))
 
-    # Check expiration
-    if collection.expires_at and collection.expires_at < datetime.now(timezone.utc):
+    if expired:
         abort(410)  # Gone
 
+    return None
+
+
+@collections.route('/files/<uuid:file_uuid>')
+def serve_file(file_uuid):
+    """Serve file through presigned URL or direct serving."""
+    file_record = g.file_record
+
     try:
-        from app.services.storage_service import StorageService
-        storage_service = StorageService()
+        storage_service = get_storage_service()
 
         if storage_service.backend == 'r2' and storage_service.r2_storage:
             # Generate presigned URL for R2 files
-            file_url = storage_service.generate_file_url(file_record, expiry_seconds=3600)
+            file_url = storage_service.generate_file_url(file_record, expiry_seconds=VARIANT_URL_EXPIRY)
             # Redirect to presigned URL for direct R2 access
             # This reduces server load and provides better performance
-            return redirect(file_url)
+            return _cache_file_response(redirect(file_url))
         else:
             # Serve local files directly
-            file_path = os.path.join(current_app.instance_path, file_record.storage_path)
-            if os.path.exists(file_path):
-                return send_file(
-                    file_path,
-                    as_attachment=True,
-                    download_name=file_record.original_filename,
-                    mimetype=file_record.mime_type
-                )
-            else:
-                abort(404)
-
+            return _send_local_file(
+                file_record.storage_path,
+                mimetype=file_record.mime_type,
+                download_name=file_record.original_filename,
+                etag=file_record.uuid
+            )
+
+    except FileNotFoundError:
+        abort(404)
     except Exception as e:
-        current_app.logger.error(f"Failed to serve file {file_uuid}: {e}")
+        logger.error("Failed to serve file %s: %s", file_uuid, e)
         abort(500)
 
 
 @collections.route('/files/<uuid:file_uuid>/thumbnail')
 def serve_thumbnail(file_uuid):
     """Serve small thumbnail for grid display."""
-    file_record = File.query.filter_by(uuid=str(file_uuid)).first_or_404()
-
-    # Check access permissions
-    collection = file_record.collection
-
-    if collection.privacy == 'password':
-        session_key = f'collection_access_{collection.uuid}'
-        if session_key not in session:
-            return redirect(url_for('collections.password_required', uuid=collection.uuid))
-
-    if collection.expires_at and collection.expires_at < datetime.now(timezone.utc):
-        abort(410)
+    file_record = g.file_record
 
     # Try to serve thumb_path (new variant system) first
     variant_path = file_record.thumb_path or file_record.thumbnail_path
 
     if variant_path:
         try:
-            from app.services.storage_service import StorageService
-            storage_service = StorageService()
+            storage_service = get_storage_service()
 
             if storage_service.backend == 'r2' and storage_service.r2_storage:
                 thumbnail_url = storage_service.r2_storage.generate_presigned_url(
                     variant_path,
-                    expiry_seconds=7200  # 2 hour cache for thumbnails
+                    expiry_seconds=VARIANT_URL_EXPIRY
                 )
-                return redirect(thumbnail_url)
+                return _cache_file_response(redirect(thumbnail_url))
             else:
                 # Serve local thumbnail
-                thumbnail_path = os.path.join(current_app.instance_path, variant_path)
-                if os.path.exists(thumbnail_path):
-                    return send_file(
-                        thumbnail_path,
-                        mimetype='image/jpeg'
-                    )
-                else:
-                    abort(404)
+                return _cache_file_response(_send_local_file(variant_path, mimetype='image/jpeg'))
 
+        except FileNotFoundError:
+            abort(404)
         except Exception as e:
-            current_app.logger.error(f"Failed to serve thumbnail for {file_uuid}: {e}")
+            logger.error("Failed to serve thumbnail for %s: %s", file_uuid, e)
             abort(500)
     else:
-        # Generate thumbnail on-demand if not exists
-        return redirect(url_for('collections.generate_thumbnail', file_uuid=file_uuid))
+        # Generate the thumbnail in the background and show a placeholder meanwhile
+        if file_record.is_image:
+            try:
+                enqueue_variant_generation([file_record.id])
+            except Exception as e:
+                logger.error("Variant generation error: %s", e)
+
+        response = send_file(
+            os.path.join(collections.static_folder, THUMBNAIL_PLACEHOLDER),
+            mimetype='image/svg+xml',
+            max_age=0
+        )
+        response.cache_control.no_cache = True
+        return response
 
 
 @collections.route('/files/<uuid:file_uuid>/preview')
 def serve_preview(file_uuid):
     """Serve medium-quality preview optimized for lightbox viewing."""
-    file_record = File.query.filter_by(uuid=str(file_uuid)).first_or_404()
-
-    # Check access permissions
-    collection = file_record.collection
-
-    if collection.privacy == 'password':
-        session_key = f'collection_access_{collection.uuid}'
-        if session_key not in session:
-            return redirect(url_for('collections.password_required', uuid=collection.uuid))
-
-    if collection.expires_at and collection.expires_at < datetime.now(timezone.utc):
-        abort(410)
+    file_record = g.file_record
 
     # Serve medium variant if available
     if file_record.medium_path:
         try:
-            from app.services.storage_service import StorageService
-            storage_service = StorageService()
+            storage_service = get_storage_service()
 
             if storage_service.backend == 'r2' and storage_service.r2_storage:
                 preview_url = storage_service.r2_storage.generate_presigned_url(
                     file_record.medium_path,
-                    expiry_seconds=7200  # 2 hour cache
+                    expiry_seconds=VARIANT_URL_EXPIRY
                 )
-                return redirect(preview_url)
+                return _cache_file_response(redirect(preview_url))
             else:
                 # Serve local preview
-                preview_path = os.path.join(current_app.instance_path, file_record.medium_path)
-                if os.path.exists(preview_path):
-                    return send_file(
-                        preview_path,
-                        mimetype='image/jpeg'
-                    )
+                return _cache_file_response(_send_local_file(file_record.medium_path, mimetype='image/jpeg'))
 
+        except FileNotFoundError:
+            pass
         except Exception as e:
-            current_app.logger.error(f"Failed to serve preview for {file_uuid}: {e}")
+            logger.error("Failed to serve preview for %s: %s", file_uuid, e)
 
     # Fallback: serve original file if preview not available
     return redirect(url_for('collections.serve_file', file_uuid=file_uuid))
@@ -462,11 +799,9 @@ def serve_preview(file_uuid):
 @collections.route('/files/<uuid:file_uuid>/generate-thumbnail')
 def generate_thumbnail(file_uuid):
     """Generate thumbnail for a file on-demand."""
-    file_record = File.query.filter_by(uuid=str(file_uuid)).first_or_404()
+    file_record = g.file_record
 
     try:
-        # Import thumbnail service (we'll create this next)
-        from app.services.thumbnail_service import ThumbnailService
         thumbnail_service = ThumbnailService()
 
         thumbnail_path = thumbnail_service.generate_thumbnail(file_record)
@@ -483,14 +818,14 @@ def generate_thumbnail(file_uuid):
             return redirect(url_for('collections.serve_file', file_uuid=file_uuid))
 
     except Exception as e:
-        current_app.logger.error(f"Failed to generate thumbnail for {file_uuid}: {e}")
+        logger.error("Failed to generate thumbnail for %s: %s", file_uuid, e)
         return redirect(url_for('collections.serve_file', file_uuid=file_uuid))
 
 
 @collections.route('/<uuid:uuid>/password', methods=['GET', 'POST'])
 def password_required(uuid):
     """Handle password-protected collection access."""
-    collection = Collection.query.filter_by(uuid=str(uuid)).first_or_404()
+    collection = Collection.query.filter_by(uuid=uuid).first_or_404()
 
     if collection.privacy != 'password':
         return redirect(url_for('collections.view', uuid=uuid))
@@ -504,3 +839,12 @@ def password_required(uuid):
             flash('Incorrect password. Please try again.', 'error')
 
     return render_template('collections/password.html', collection=collection)
+
+
+@collections.errorhandler(RequestEntityTooLarge)
+def request_too_large(error):
+    """Answer uploads past MAX_CONTENT_LENGTH with JSON before their body is read."""
+    return jsonify({
+        'success': False,
+        'error': 'Upload too large. Maximum 10GB per collection.'
+    }), 413
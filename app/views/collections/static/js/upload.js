@@ -715,13 +715,9 @@ class CollectionUploader {
                         // Track progress for this specific file
                         fileProgressMap.set(fileObj.id, { uploaded: 0, total: fileObj.file.size });
 
-                        const uploadFormData = new FormData();
-                        uploadFormData.append('collection_id', collectionId);
-                        uploadFormData.append(`file_${fileObj.id}`, fileObj.file, fileObj.name);
-
-                        const response = await this.uploadWithProgress(
-                            '/collections/api/upload-files',
-                            uploadFormData,
+                        const response = await this.uploadFile(
+                            collectionId,
+                            fileObj,
                             (progress) => this.handleFileProgress(fileObj.id, progress, fileProgressMap, totalBytes)
                         );
 
@@ -1102,6 +1098,101 @@ class CollectionUploader {
         }
     }
 
+    async uploadFile(collectionId, fileObj, progressCallback) {
+        // Send the bytes straight to storage when the server can presign them
+        if (this.directUploads !== false) {
+            const presign = await this.postJson('/collections/api/presign', {
+                collection_id: collectionId,
+                filename: fileObj.name,
+                content_type: fileObj.file.type,
+                size: fileObj.file.size
+            });
+
+            if (presign.direct_upload) {
+                await this.putWithProgress(presign.upload, fileObj.file, progressCallback);
+                return this.postJson('/collections/api/complete-upload', {
+                    collection_id: collectionId,
+                    filename: fileObj.name
+                });
+            }
+
+            if (presign.direct_upload !== false) {
+                return presign;
+            }
+
+            // Storage backend can't take direct uploads; proxy through the server
+            this.directUploads = false;
+        }
+
+        const uploadFormData = new FormData();
+        uploadFormData.append('collection_id', collectionId);
+        uploadFormData.append(`file_${fileObj.id}`, fileObj.file, fileObj.name);
+
+        return this.uploadWithProgress('/collections/api/upload-files', uploadFormData, progressCallback);
+    }
+
+    async postJson(url, data) {
+        const response = await fetch(url, {
+            method: 'POST',
+            body: JSON.stringify(data),
+            headers: {
+                'Content-Type': 'application/json',
+                'X-Requested-With': 'XMLHttpRequest'
+            }
+        });
+
+        try {
+            return await response.json();
+        } catch (e) {
+            throw new Error('Invalid response format');
+        }
+    }
+
+    async putWithProgress(upload, file, progressCallback) {
+        return new Promise((resolve, reject) => {
+            const xhr = new XMLHttpRequest();
+
+            xhr.upload.addEventListener('progress', (e) => {
+                if (e.lengthComputable && progressCallback) {
+                    progressCallback({
+                        loaded: e.loaded,
+                        total: e.total,
+                        percent: (e.loaded / e.total) * 100
+                    });
+                }
+            });
+
+            xhr.addEventListener('load', () => {
+                if (xhr.status >= 200 && xhr.status < 300) {
+                    resolve();
+                } else {
+                    reject(new Error(`Upload failed with status ${xhr.status}`));
+                }
+            });
+
+            xhr.addEventListener('error', () => {
+                reject(new Error('Network error during upload'));
+            });
+
+            xhr.addEventListener('abort', () => {
+                reject(new Error('Upload was cancelled'));
+            });
+
+            xhr.addEventListener('timeout', () => {
+                reject(new Error('Upload timeout'));
+            });
+
+            // Set timeout for large file uploads (30 minutes)
+            xhr.timeout = 30 * 60 * 1000;
+
+            xhr.open(upload.method, upload.url);
+            for (const [name, value] of Object.entries(upload.headers || {})) {
+                xhr.setRequestHeader(name, value);
+            }
+            xhr.send(file);
+        });
+    }
+
     async uploadWithProgress(url, formData, progressCallback) {
         return new Promise((resolve, reject) => {
             const xhr = new XMLHttpRequest();
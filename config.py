@@ -9,6 +9,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+def database_engine_options(database_uri):
+    """Connection pool settings for the given database URL."""
+    options = {'pool_pre_ping': True, 'pool_recycle': 1800}
+
+    # SQLite connections are local files; only server databases get a sized pool
+    if not database_uri.startswith('sqlite'):
+        options.update(
+            pool_size=int(os.environ.get('DB_POOL_SIZE', 20)),
+            max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 40)),
+            pool_timeout=30
+        )
+
+    if database_uri.startswith('postgresql'):
+        options['connect_args'] = {'options': '-c statement_timeout=30000'}
+
+    return options
+
+
 class Config:
     """Base configuration class."""
 
@@ -21,6 +39,7 @@ class Config:
         'sqlite:///openharbor.db'
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    SQLALCHEMY_ENGINE_OPTIONS = database_engine_options(SQLALCHEMY_DATABASE_URI)
 
     # Security configurations
     WTF_CSRF_ENABLED = True
@@ -41,6 +60,24 @@ class Config:
     MAX_TOTAL_SIZE = 10 * 1024 * 1024 * 1024  # 10GB per collection
     MAX_BATCH_FILES = 100  # For batch operations
 
+    # Werkzeug answers 413 before reading a request body larger than one full collection
+    MAX_CONTENT_LENGTH = MAX_TOTAL_SIZE
+
+    # Concurrent storage uploads per application process
+    UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 16))
+
+    # Background image variant generation (0 runs it inline in the request)
+    VARIANT_WORKERS = int(os.environ.get('VARIANT_WORKERS', 3))
+
+    # Local file serving: let the front-end server send file bodies instead of Python.
+    # USE_X_SENDFILE emits X-Sendfile (Apache, lighttpd); X_ACCEL_REDIRECT_PREFIX is the
+    # nginx internal location that maps to the instance folder, e.g. /_protected/
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
+    X_ACCEL_REDIRECT_PREFIX = os.environ.get('X_ACCEL_REDIRECT_PREFIX')
+
+    # Seconds browsers may cache static assets (CSS, JS, images) before revalidating
+    SEND_FILE_MAX_AGE_DEFAULT = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
     @staticmethod
     def validate_required_config():
         """Validate that required configuration is present."""
@@ -71,8 +108,15 @@ class TestingConfig(Config):
     """Testing configuration."""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
     WTF_CSRF_ENABLED = False
 
+    # The in-memory database shares one connection, so keep jobs on the request thread
+    VARIANT_WORKERS = 0
+
+    # Hash test passwords with a single PBKDF2 round instead of the slow default KDF
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1'
+
 
 config = {
     'development': DevelopmentConfig,
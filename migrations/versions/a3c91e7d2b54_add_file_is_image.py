@@ -0,0 +1,29 @@
+"""Add is_image flag to files
+
+Revision ID: a3c91e7d2b54
+Revises: f27bd10b7ec4
+Create Date: 2026-10-15 10:12:41.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c91e7d2b54'
+down_revision: Union[str, Sequence[str], None] = 'f27bd10b7ec4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add is_image column to files table and backfill it from mime_type."""
+    op.add_column('files', sa.Column('is_image', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.execute("UPDATE files SET is_image = (mime_type LIKE 'image/%')")
+
+
+def downgrade() -> None:
+    """Remove is_image column from files table."""
+    op.drop_column('files', 'is_image')
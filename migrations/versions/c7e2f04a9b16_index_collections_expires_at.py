@@ -0,0 +1,27 @@
+"""Index collections.expires_at
+
+Revision ID: c7e2f04a9b16
+Revises: a3c91e7d2b54
+Create Date: 2026-10-15 11:03:27.904512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7e2f04a9b16'
+down_revision: Union[str, Sequence[str], None] = 'a3c91e7d2b54'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Add an index on collections.expires_at."""
+    op.create_index('ix_collections_expires_at', 'collections', ['expires_at'])
+
+
+def downgrade() -> None:
+    """Drop the collections.expires_at index."""
+    op.drop_index('ix_collections_expires_at', table_name='collections')
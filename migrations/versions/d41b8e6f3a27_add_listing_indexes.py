@@ -0,0 +1,29 @@
+"""Add composite indexes for collection and file listings
+
+Revision ID: d41b8e6f3a27
+Revises: c7e2f04a9b16
+Create Date: 2026-10-15 14:22:09.615830
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41b8e6f3a27'
+down_revision: Union[str, Sequence[str], None] = 'c7e2f04a9b16'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index files by collection and upload time, and collections by owner and creation time."""
+    op.create_index('ix_files_collection_created', 'files', ['collection_id', 'created_at'])
+    op.create_index('ix_collections_user_created', 'collections', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    """Drop the listing indexes."""
+    op.drop_index('ix_collections_user_created', table_name='collections')
+    op.drop_index('ix_files_collection_created', table_name='files')
@@ -0,0 +1,52 @@
+"""Store collection and file uuids with the Uuid type
+
+Revision ID: e8a3f51c6d90
+Revises: d41b8e6f3a27
+Create Date: 2026-10-15 15:41:27.302118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a3f51c6d90'
+down_revision: Union[str, Sequence[str], None] = 'd41b8e6f3a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('collections', 'files')
+
+
+def upgrade() -> None:
+    """Convert uuid columns to native uuid on PostgreSQL and dashless CHAR(32) elsewhere."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN uuid TYPE uuid USING uuid::uuid")
+        return
+
+    for table in TABLES:
+        # sa.Uuid stores the 32 hex digits without dashes on other backends
+        op.execute(f"UPDATE {table} SET uuid = REPLACE(uuid, '-', '')")
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('uuid', existing_type=sa.String(length=36), type_=sa.Uuid(),
+                                  existing_nullable=False)
+
+
+def downgrade() -> None:
+    """Convert uuid columns back to dashed VARCHAR(36) strings."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for table in TABLES:
+            op.execute(f"ALTER TABLE {table} ALTER COLUMN uuid TYPE varchar(36) USING uuid::text")
+        return
+
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('uuid', existing_type=sa.Uuid(), type_=sa.String(length=36),
+                                  existing_nullable=False)
+        op.execute(
+            f"UPDATE {table} SET uuid = SUBSTR(uuid, 1, 8) || '-' || SUBSTR(uuid, 9, 4) || '-' || "
+            f"SUBSTR(uuid, 13, 4) || '-' || SUBSTR(uuid, 17, 4) || '-' || SUBSTR(uuid, 21, 12)"
+        )
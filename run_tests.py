@@ -8,98 +8,143 @@ with detailed reporting and coverage analysis.
 
 import os
 import sys
-import subprocess
+import asyncio
 import argparse
-from pathlib import Path
+from functools import cache
+from importlib import metadata
 
+# Interpreter for lint, type check and test commands: the project's virtual
+# environment if there is one, otherwise the one running this script
+PYTHON_CMD = '.venv/bin/python' if os.path.exists('.venv/bin/python') else sys.executable
 
-def run_command(cmd, description, exit_on_error=True):
-    """Run a command and handle the output."""
-    print(f"\n{'='*60}")
-    print(f"Running: {description}")
-    print(f"Command: {' '.join(cmd)}")
-    print(f"{'='*60}")
+
+async def run_command(cmd, description, stream=True):
+    """
+    Run a command and return True if it succeeded.
+
+    With stream=False the output is buffered and printed in one block when the
+    command exits, so commands running side by side do not interleave.
+    """
+    header = command_header(cmd, description)
+    if stream:
+        print(header, flush=True)
 
     try:
-        result = subprocess.run(cmd, check=True, capture_output=False)
-        print(f"\n✅ {description} completed successfully!")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"\n❌ {description} failed with exit code {e.returncode}")
-        if exit_on_error:
-            sys.exit(1)
-        return False
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=None if stream else asyncio.subprocess.PIPE,
+            stderr=None if stream else asyncio.subprocess.STDOUT
+        )
+        output, _ = await process.communicate()
     except FileNotFoundError:
+        if not stream:
+            print(header)
         print(f"\n❌ Command not found: {cmd[0]}")
         if 'pytest' in cmd[0]:
             print("   Try installing pytest: pip install pytest")
-        if exit_on_error:
-            sys.exit(1)
         return False
 
+    if not stream:
+        print(header)
+        print(output.decode(errors='replace'), end='', flush=True)
+
+    if process.returncode == 0:
+        print(f"\n✅ {description} completed successfully!")
+        return True
+
+    print(f"\n❌ {description} failed with exit code {process.returncode}")
+    return False
+
+
+def run_pytest_in_process(cmd, description):
+    """
+    Run a pytest command inside this interpreter and return True if it passed.
+
+    Saves starting a second interpreter when the command would run
+    sys.executable anyway; cmd[3:] drops the leading "python -m pytest".
+    """
+    import pytest
+
+    print(command_header(cmd, description), flush=True)
+    exit_code = pytest.main(cmd[3:])
+
+    if exit_code == 0:
+        print(f"\n✅ {description} completed successfully!")
+        return True
+
+    print(f"\n❌ {description} failed with exit code {int(exit_code)}")
+    return False
+
+
+def command_header(cmd, description):
+    """Return the banner printed before a command's output."""
+    return f"\n{'='*60}\nRunning: {description}\nCommand: {' '.join(cmd)}\n{'='*60}"
+
+
+async def run_commands(commands):
+    """Run (cmd, description) pairs concurrently and return their results in order."""
+    # A lone command streams its output live; several buffer theirs
+    stream = len(commands) == 1
+    return await asyncio.gather(*(
+        run_command(cmd, description, stream=stream) for cmd, description in commands
+    ))
+
 
 def check_dependencies():
     """Check that required testing dependencies are available."""
     print("Checking testing dependencies...")
 
-    try:
-        import pytest
-        print(f"✅ pytest {pytest.__version__} found")
-    except ImportError:
+    # pytest runs in a subprocess, so only look packages up instead of importing them
+    pytest_version = installed_version('pytest')
+    if pytest_version is None:
         print("❌ pytest not found. Install with: pip install pytest")
         return False
+    print(f"✅ pytest {pytest_version} found")
 
-    try:
-        import flask
-        print(f"✅ Flask {flask.__version__} found")
-    except ImportError:
+    flask_version = installed_version('flask')
+    if flask_version is None:
         print("❌ Flask not found. Install with: pip install flask")
         return False
+    print(f"✅ Flask {flask_version} found")
+
+    if xdist_available():
+        print("✅ pytest-xdist found")
+    else:
+        print("📝 pytest-xdist not found, tests will run serially. Install with: pip install pytest-xdist")
 
     return True
 
 
-def run_linting(args):
-    """Run code linting if requested."""
-    if not args.lint:
-        return True
+def installed_version(distribution):
+    """Return the installed version of a distribution, or None if it is missing."""
+    try:
+        return metadata.version(distribution)
+    except metadata.PackageNotFoundError:
+        return None
 
-    success = True
 
-    # Try to run flake8 if available
-    try:
-        success &= run_command(
-            ['python', '-m', 'flake8', 'app/', 'tests/'],
-            "Linting with flake8",
-            exit_on_error=False
-        )
-    except:
-        print("📝 flake8 not available, skipping linting")
+def xdist_available():
+    """Return True if pytest-xdist can spread the suite over several processes."""
+    return installed_version('pytest-xdist') is not None
+
 
-    return success
+def linting_command(args):
+    """Return the linting command if requested."""
+    if not args.lint:
+        return None
+    return [PYTHON_CMD, '-m', 'flake8', 'app/', 'tests/'], "Linting with flake8"
 
 
-def run_type_checking(args):
-    """Run type checking if requested."""
+def type_checking_command(args):
+    """Return the type checking command if requested."""
     if not args.typecheck:
-        return True
+        return None
+    return [PYTHON_CMD, '-m', 'mypy', 'app/', '--ignore-missing-imports'], "Type checking with mypy"
 
-    try:
-        return run_command(
-            ['python', '-m', 'mypy', 'app/', '--ignore-missing-imports'],
-            "Type checking with mypy",
-            exit_on_error=False
-        )
-    except:
-        print("📝 mypy not available, skipping type checking")
-        return True
 
-
-def run_tests(args):
-    """Run the test suite with pytest."""
-    # Use virtual environment if available
-    python_cmd = '.venv/bin/python' if os.path.exists('.venv/bin/python') else 'python'
-    cmd = [python_cmd, '-m', 'pytest']
+def test_command(args):
+    """Build the pytest command for the test suite."""
+    cmd = [PYTHON_CMD, '-m', 'pytest']
 
     # Add verbosity
     if args.verbose:
@@ -107,13 +152,32 @@ def run_tests(args):
 
     # Add coverage if requested
     if args.coverage:
-        try:
-            import coverage
+        if installed_version('pytest-cov') is not None:
             cmd.extend(['--cov=app', '--cov-report=html', '--cov-report=term'])
             print("📊 Coverage reporting enabled")
-        except ImportError:
+        else:
             print("📝 coverage not available, skipping coverage reporting")
 
+    # Re-run only the tests that failed last time (everything if none did).
+    # Results live in .pytest_cache/, which CI can persist between runs
+    if args.incremental:
+        cmd.extend(['--lf', '--ff'])
+        print("🔁 Re-running last failed tests first")
+
+    # Terse, colourless output for CI logs. The cache is only written when
+    # --incremental needs it for the next run
+    if args.ci:
+        cmd.extend(['-q', '--tb=line', '--no-header', '--no-summary', '--color=no'])
+        if not args.incremental:
+            cmd.extend(['-p', 'no:cacheprovider'])
+
+    # Spread test files over worker processes. Tests from one file stay on one
+    # worker so they keep sharing its app and client fixtures; pytest-cov
+    # combines coverage from the workers itself
+    if not args.serial and xdist_available():
+        cmd.extend(['-n', 'auto', '--dist', 'loadfile', '--maxprocesses', '8'])
+        print("⚡ Running tests in parallel with pytest-xdist")
+
     # Add specific test file if provided
     if args.test_file:
         cmd.append(args.test_file)
@@ -124,19 +188,24 @@ def run_tests(args):
     if args.pytest_args:
         cmd.extend(args.pytest_args.split())
 
-    return run_command(cmd, "Running test suite")
+    return cmd, "Running test suite"
 
 
-def generate_report():
+def generate_report(args):
     """Generate a test report summary."""
     print(f"\n{'='*60}")
     print("Test Report Summary")
     print(f"{'='*60}")
 
-    # Check if coverage html report was generated
-    coverage_dir = Path("htmlcov")
-    if coverage_dir.exists():
-        print(f"📊 Coverage report generated: {coverage_dir.absolute()}/index.html")
+    # Only look for the coverage html report when this run wrote one, so a
+    # stale htmlcov/ from an earlier run is not reported as fresh
+    if args.coverage:
+        # Only the report needs pathlib, so it is imported here
+        from pathlib import Path
+
+        coverage_dir = Path("htmlcov")
+        if coverage_dir.exists():
+            print(f"📊 Coverage report generated: {coverage_dir.absolute()}/index.html")
 
     print("\n🎉 Test harness completed!")
     print("\nTo run specific tests:")
@@ -145,10 +214,13 @@ def generate_report():
     print("  python run_tests.py --coverage")
     print("\nTo run with linting:")
     print("  python run_tests.py --lint")
+    print("\nTo re-run only the tests that failed:")
+    print("  python run_tests.py --incremental")
 
 
-def main():
-    """Main test runner function."""
+@cache
+def build_parser():
+    """Build the command line parser (once per process)."""
     parser = argparse.ArgumentParser(
         description="Test harness for The Open Harbor application",
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -159,6 +231,10 @@ Examples:
   python run_tests.py --coverage         # Run with coverage reporting
   python run_tests.py --lint             # Run linting before tests
   python run_tests.py --typecheck        # Run type checking
+  python run_tests.py --serial           # Run tests in one process
+  python run_tests.py --incremental      # Re-run only last run's failures
+  python run_tests.py --exec             # Hand the process over to pytest
+  python run_tests.py --ci               # Terse, colourless output for CI logs
   python run_tests.py --test-file tests/test_routes.py  # Run specific test file
         """
     )
@@ -187,6 +263,30 @@ Examples:
         help='Run type checking before tests'
     )
 
+    parser.add_argument(
+        '--incremental', '-i',
+        action='store_true',
+        help='Only re-run tests that failed on the previous run'
+    )
+
+    parser.add_argument(
+        '--exec',
+        action='store_true',
+        help='Replace this process with pytest (exit code is pytest\'s, no summary report)'
+    )
+
+    parser.add_argument(
+        '--ci',
+        action='store_true',
+        help='Keep output short and colourless for non-interactive CI runs'
+    )
+
+    parser.add_argument(
+        '--serial',
+        action='store_true',
+        help='Run tests in a single process even if pytest-xdist is installed'
+    )
+
     parser.add_argument(
         '--test-file',
         help='Run a specific test file'
@@ -203,7 +303,12 @@ Examples:
         help='Skip dependency checking'
     )
 
-    args = parser.parse_args()
+    return parser
+
+
+def main():
+    """Main test runner function."""
+    args = build_parser().parse_args()
 
     print("🚀 The Open Harbor Test Harness")
     print(f"Working directory: {os.getcwd()}")
@@ -215,20 +320,36 @@ Examples:
     # Set environment variables for testing
     os.environ['FLASK_ENV'] = 'testing'
     os.environ['TSH_SECRET_KEY'] = 'test-secret-key-for-testing-only'
+    if args.ci:
+        # Also stops flake8, mypy and the pytest plugins from colouring their output
+        os.environ['NO_COLOR'] = '1'
+        os.environ['PY_COLORS'] = '0'
+
+    # Linting, type checking and tests only read the tree, so they run side by side
+    checks = [command for command in (linting_command(args), type_checking_command(args)) if command]
+
+    if args.exec:
+        # Checks run first, then this process becomes pytest and exits with its code
+        if checks and not all(asyncio.run(run_commands(checks))):
+            print("\n⚠️  Some checks failed!")
+        cmd, description = test_command(args)
+        print(command_header(cmd, description), flush=True)
+        os.execvp(cmd[0], cmd)
+
+    # PYTHON_CMD may be the relative .venv path, so compare absolute paths
+    if checks or os.path.abspath(PYTHON_CMD) != os.path.abspath(sys.executable):
+        # Checks run alongside the tests, and a virtualenv needs its own interpreter
+        *check_results, tests_passed = asyncio.run(run_commands(checks + [test_command(args)]))
+    else:
+        check_results, tests_passed = [], run_pytest_in_process(*test_command(args))
 
-    success = True
-
-    # Run linting if requested
-    success &= run_linting(args)
-
-    # Run type checking if requested
-    success &= run_type_checking(args)
+    if not tests_passed:
+        sys.exit(1)
 
-    # Run the main test suite
-    success &= run_tests(args)
+    success = all(check_results)
 
     # Generate report
-    generate_report()
+    generate_report(args)
 
     if not success:
         print("\n⚠️  Some tests or checks failed!")
@@ -3,44 +3,34 @@ Comprehensive tests for The Open Harbor authentication system.
 """
 
 import pytest
-from app import create_app
 from app.models import db, User
 from flask import url_for
-import tempfile
-import os
+from tests.helpers import assert_all_in
 
-
-@pytest.fixture(scope='function')
-def app():
-    """Create application for tests with in-memory database."""
-    # Create app with testing config from the start
-    app = create_app('testing')
-
-    app.config.update({
-        'SECRET_KEY': 'test-secret-key-for-testing',
-    })
-
-    with app.app_context():
-        db.create_all()
-        yield app
-        db.drop_all()
+# Tests share the session-wide app and database; db_session empties it after each one
+pytestmark = pytest.mark.usefixtures('db_session')
 
 
 @pytest.fixture(scope='function')
 def client(app):
-    """Test client for the app."""
+    """Test client with its own cookie jar, so every test starts logged out."""
     return app.test_client()
 
 
+def flashed_messages(client):
+    """Return the (category, message) pairs flashed but not yet rendered."""
+    with client.session_transaction() as sess:
+        return sess.get('_flashes', [])
+
+
 @pytest.fixture(scope='function')
-def test_user(app):
+def test_user(db_session):
     """Create a test user."""
-    with app.app_context():
-        user = User(email='testuser@example.com')
-        user.set_password('TestPassword123')
-        db.session.add(user)
-        db.session.commit()
-        return user
+    user = User(email='testuser@example.com')
+    user.set_password('TestPassword123')
+    db_session.add(user)
+    db_session.commit()
+    return user
 
 
 class TestUserModel:
@@ -56,6 +46,19 @@ class TestUserModel:
             assert user.check_password('TestPassword123') is True
             assert user.check_password('wrongpassword') is False
 
+    def test_password_hash_method_follows_config(self, app):
+        """Test that tests hash cheaply while the default KDF is used otherwise."""
+        from unittest.mock import patch
+
+        user = User(email='test@example.com')
+        user.set_password('TestPassword123')
+        assert user.password_hash.startswith('pbkdf2:sha256:1$')
+
+        with patch.dict(app.config, {'PASSWORD_HASH_METHOD': None}):
+            user.set_password('TestPassword123')
+        assert user.password_hash.startswith('scrypt:')
+        assert user.check_password('TestPassword123') is True
+
     def test_password_validation(self, app):
         """Test password complexity validation."""
         with app.app_context():
@@ -95,15 +98,13 @@ class TestAuthRoutes:
         """Test that signup page loads successfully."""
         response = client.get('/auth/sign-up')
         assert response.status_code == 200
-        assert b'Join The Open Harbor' in response.data
-        assert b'Create your secure file storage account' in response.data
+        assert_all_in(response.data, b'Join The Open Harbor', b'Create your secure file storage account')
 
     def test_login_page_loads(self, client):
         """Test that login page loads successfully."""
         response = client.get('/auth/log-in')
         assert response.status_code == 200
-        assert b'Welcome back' in response.data
-        assert b'Sign in to your Open Harbor account' in response.data
+        assert_all_in(response.data, b'Welcome back', b'Sign in to your Open Harbor account')
 
     def test_successful_signup(self, client):
         """Test successful user registration."""
@@ -111,10 +112,11 @@ class TestAuthRoutes:
             'email': 'newuser@example.com',
             'password': 'ValidPassword123',
             'password2': 'ValidPassword123'
-        }, follow_redirects=True)
+        })
 
-        assert response.status_code == 200
-        assert b'Welcome to The Open Harbor' in response.data
+        # Check the flash before the redirect target renders and consumes it
+        assert response.status_code == 302
+        assert ('success', 'Welcome to The Open Harbor! Your account has been created.') in flashed_messages(client)
 
     def test_duplicate_email_signup(self, client, test_user):
         """Test signup with already registered email."""
@@ -154,10 +156,10 @@ class TestAuthRoutes:
         response = client.post('/auth/log-in', data={
             'email': 'testuser@example.com',
             'password': 'TestPassword123'
-        }, follow_redirects=True)
+        })
 
-        assert response.status_code == 200
-        assert b'Welcome back' in response.data
+        assert response.status_code == 302
+        assert ('success', 'Welcome back!') in flashed_messages(client)
 
     def test_invalid_login(self, client, test_user):
         """Test login with invalid credentials."""
@@ -195,9 +197,9 @@ class TestAuthRoutes:
         })
 
         # Then logout
-        response = client.get('/auth/log-out', follow_redirects=True)
-        assert response.status_code == 200
-        assert b'You have been logged out successfully' in response.data
+        response = client.get('/auth/log-out')
+        assert response.status_code == 302
+        assert ('info', 'You have been logged out successfully.') in flashed_messages(client)
 
     def test_redirect_after_login(self, client, test_user):
         """Test redirect to intended page after login."""
@@ -223,8 +225,7 @@ class TestAuthIntegration:
         """Test that navigation shows user info when logged in."""
         # Check logged out state
         response = client.get('/')
-        assert b'Log In' in response.data
-        assert b'Sign Up' in response.data
+        assert_all_in(response.data, b'Log In', b'Sign Up')
 
         # Login
         client.post('/auth/log-in', data={
@@ -234,8 +235,7 @@ class TestAuthIntegration:
 
         # Check logged in state
         response = client.get('/')
-        assert b'testuser@example.com' in response.data
-        assert b'Log Out' in response.data
+        assert_all_in(response.data, b'testuser@example.com', b'Log Out')
 
     def test_authenticated_user_redirect_from_auth_pages(self, client, test_user):
         """Test that logged in users are redirected from auth pages."""
@@ -278,6 +278,23 @@ class TestSecurityFeatures:
             assert user.password_hash != original_password
             assert original_password not in user.password_hash
 
+    def test_login_nonexistent_user_still_hashes(self, client):
+        """Test that unknown emails still pay the password hashing cost."""
+        from unittest.mock import patch
+        from app.views.auth import auth_routes
+
+        with patch.object(auth_routes, 'check_password_hash', return_value=False) as mock_check:
+            response = client.post('/auth/log-in', data={
+                'email': 'nonexistent@example.com',
+                'password': 'SomePassword123'
+            })
+
+        assert response.status_code == 200
+        assert b'Invalid email or password' in response.data
+        mock_check.assert_called_once_with(auth_routes._dummy_password_hash(), 'SomePassword123')
+        # Hashed like real passwords, so it is as cheap as theirs under TestingConfig
+        assert auth_routes._dummy_password_hash().startswith('pbkdf2:sha256:1$')
+
     def test_sql_injection_protection(self, client):
         """Test that SQL injection attempts are handled safely."""
         # Attempt SQL injection in email field
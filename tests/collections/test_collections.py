@@ -3,81 +3,77 @@ Tests for collections functionality including upload, view, and management.
 """
 
 import pytest
-import tempfile
 import os
 import json
 from datetime import datetime, timedelta, timezone
 from unittest.mock import patch, MagicMock
 from werkzeug.datastructures import FileStorage
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
+from uuid import UUID
 
 from app import create_app
+from app.forms import CollectionForm
 from app.models import db, User, Collection, File
+from tests.helpers import SAMPLE_JPEG, count_queries, login_as
 
 
-@pytest.fixture(scope='function')
-def test_user(app):
-    """Create a test user."""
-    with app.app_context():
-        # Clean up any existing test users first
-        existing_user = User.query.filter_by(email='test@example.com').first()
-        if existing_user:
-            db.session.delete(existing_user)
-            db.session.commit()
-
-        user = User(email='test@example.com')
-        user.set_password('TestPass123')
-        db.session.add(user)
-        db.session.commit()
+# Tests share the session-wide app and database; db_session empties it after each one
+pytestmark = pytest.mark.usefixtures('db_session')
 
-        yield user
 
-        # Clean up after test
-        db.session.delete(user)
-        db.session.commit()
+@pytest.fixture(scope='function')
+def test_user(db_session):
+    """Create a test user."""
+    user = User(email='test@example.com')
+    user.set_password('TestPass123')
+    db_session.add(user)
+    db_session.commit()
+    return user
 
 
 @pytest.fixture(scope='function')
-def test_collection(app, test_user):
+def test_collection(db_session, test_user):
     """Create a test collection."""
-    with app.app_context():
-        collection = Collection(
-            name='Test Collection',
-            description='A test photo collection',
-            privacy='unlisted',
-            user_id=test_user.id
-        )
-        db.session.add(collection)
-        db.session.commit()
+    collection = Collection(
+        name='Test Collection',
+        description='A test photo collection',
+        privacy='unlisted',
+        user_id=test_user.id
+    )
+    db_session.add(collection)
+    db_session.commit()
+    return collection
 
-        yield collection
 
-        # Clean up handled by cascade delete when user is deleted
+@pytest.fixture
+def make_file(db_session):
+    """Return a factory for File records, saved to the database unless save=False."""
+    def make(collection, filename='photo.jpg', save=True, **fields):
+        fields.setdefault('original_filename', filename)
+        fields.setdefault('mime_type', 'image/jpeg')
+        fields.setdefault('size', 1024)
+        fields.setdefault('storage_path', f'uploads/{filename}')
+        file = File(filename=filename, collection_id=collection.id, **fields)
+        if save:
+            db_session.add(file)
+            db_session.commit()
+        return file
+    return make
 
 
 @pytest.fixture
 def sample_image():
     """Create a sample image file for testing."""
-    # Create a minimal JPEG file (1x1 pixel)
-    jpeg_data = bytes([
-        0xFF, 0xD8, 0xFF, 0xE0, 0x00, 0x10, 0x4A, 0x46, 0x49, 0x46, 0x00, 0x01,
-        0x01, 0x01, 0x00, 0x48, 0x00, 0x48, 0x00, 0x00, 0xFF, 0xDB, 0x00, 0x43,
-        0x00, 0x08, 0x06, 0x06, 0x07, 0x06, 0x05, 0x08, 0x07, 0x07, 0x07, 0x09,
-        0x09, 0x08, 0x0A, 0x0C, 0x14, 0x0D, 0x0C, 0x0B, 0x0B, 0x0C, 0x19, 0x12,
-        0x13, 0x0F, 0x14, 0x1D, 0x1A, 0x1F, 0x1E, 0x1D, 0x1A, 0x1C, 0x1C, 0x20,
-        0x24, 0x2E, 0x27, 0x20, 0x22, 0x2C, 0x23, 0x1C, 0x1C, 0x28, 0x37, 0x29,
-        0x2C, 0x30, 0x31, 0x34, 0x34, 0x34, 0x1F, 0x27, 0x39, 0x3D, 0x38, 0x32,
-        0x3C, 0x2E, 0x33, 0x34, 0x32, 0xFF, 0xC0, 0x00, 0x11, 0x08, 0x00, 0x01,
-        0x00, 0x01, 0x01, 0x01, 0x11, 0x00, 0x02, 0x11, 0x01, 0x03, 0x11, 0x01,
-        0xFF, 0xC4, 0x00, 0x14, 0x00, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x08, 0xFF, 0xC4,
-        0x00, 0x14, 0x10, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xFF, 0xDA, 0x00, 0x0C,
-        0x03, 0x01, 0x00, 0x02, 0x11, 0x03, 0x11, 0x00, 0x3F, 0x00, 0xB2, 0xC0,
-        0x07, 0xFF, 0xD9
-    ])
-
-    return BytesIO(jpeg_data)
+    return BytesIO(SAMPLE_JPEG)
+
+
+def created_collection(response):
+    """Return the collection a successful create request redirected to."""
+    assert response.status_code == 302
+    collection_uuid = UUID(response.location.rstrip('/').rsplit('/', 1)[-1])
+    # Unique, indexed lookup; the row is already in the session requests share
+    return Collection.query.filter_by(uuid=collection_uuid).one()
 
 
 class TestCollectionRoutes:
@@ -91,91 +87,72 @@ class TestCollectionRoutes:
 
     def test_upload_page_renders_for_authenticated_user(self, client, test_user):
         """Test upload page renders correctly for logged-in user."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         response = client.get('/collections/upload')
         assert response.status_code == 200
         assert b'Upload Collection' in response.data
         assert b'drag-drop' in response.data.lower() or b'upload-zone' in response.data
 
-    def test_create_collection_with_valid_data(self, client, test_user, app):
+    def test_create_collection_with_valid_data(self, client, test_user):
         """Test creating a collection with valid data."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         form_data = {
             'name': 'My Test Collection',
             'description': 'A beautiful collection of photos',
             'privacy': 'unlisted',
-            'expiration': '',
-            'csrf_token': 'test'  # Would need proper CSRF token in real test
+            'expiration': ''
         }
 
-        with patch('flask_wtf.csrf.validate_csrf', return_value=True):
-            response = client.post('/collections/upload', data=form_data, follow_redirects=True)
+        response = client.post('/collections/upload', data=form_data)
 
-            # Check if collection was created
-            with app.app_context():
-                collection = Collection.query.filter_by(name='My Test Collection').first()
-                assert collection is not None
-                assert collection.user_id == test_user.id
-                assert collection.description == 'A beautiful collection of photos'
-                assert collection.privacy == 'unlisted'
+        collection = created_collection(response)
+        assert collection.name == 'My Test Collection'
+        assert collection.user_id == test_user.id
+        assert collection.description == 'A beautiful collection of photos'
+        assert collection.privacy == 'unlisted'
 
-    def test_create_collection_with_password(self, client, test_user, app):
+    def test_create_collection_with_password(self, client, test_user):
         """Test creating a password-protected collection."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         form_data = {
             'name': 'Secret Collection',
             'description': '',
             'privacy': 'password',
             'password': 'secret123',
-            'expiration': '',
-            'csrf_token': 'test'
+            'expiration': ''
         }
 
-        with patch('flask_wtf.csrf.validate_csrf', return_value=True):
-            response = client.post('/collections/upload', data=form_data, follow_redirects=True)
+        response = client.post('/collections/upload', data=form_data)
 
-            with app.app_context():
-                collection = Collection.query.filter_by(name='Secret Collection').first()
-                assert collection is not None
-                assert collection.privacy == 'password'
-                assert collection.password_hash is not None
-                assert collection.check_password('secret123')
+        collection = created_collection(response)
+        assert collection.name == 'Secret Collection'
+        assert collection.privacy == 'password'
+        assert collection.password_hash is not None
+        assert collection.check_password('secret123')
 
-    def test_create_collection_with_expiration(self, client, test_user, app):
+    def test_create_collection_with_expiration(self, client, test_user):
         """Test creating a collection with expiration."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         form_data = {
             'name': 'Temporary Collection',
             'description': '',
             'privacy': 'unlisted',
-            'expiration': '1_week',
-            'csrf_token': 'test'
+            'expiration': '1_week'
         }
 
-        with patch('flask_wtf.csrf.validate_csrf', return_value=True):
-            response = client.post('/collections/upload', data=form_data, follow_redirects=True)
+        # The code uses UTC but stores a naive datetime, so compare naive UTC times
+        before = datetime.now(timezone.utc).replace(tzinfo=None)
+        response = client.post('/collections/upload', data=form_data)
+        after = datetime.now(timezone.utc).replace(tzinfo=None)
 
-            with app.app_context():
-                collection = Collection.query.filter_by(name='Temporary Collection').first()
-                assert collection is not None
-                assert collection.expires_at is not None
-                # Should expire approximately 1 week from now
-                # Note: The code uses UTC but stores as naive datetime
-                expected_expiry = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(weeks=1)
-                time_diff = abs((collection.expires_at - expected_expiry).total_seconds())
-                assert time_diff < 3600  # Within 1 hour to account for any timezone differences
+        collection = created_collection(response)
+        assert collection.name == 'Temporary Collection'
+        # Exactly one week after some moment during the request
+        assert before + timedelta(weeks=1) <= collection.expires_at <= after + timedelta(weeks=1)
 
     def test_view_collection_exists(self, client, test_collection):
         """Test viewing an existing collection."""
@@ -183,6 +160,17 @@ class TestCollectionRoutes:
         assert response.status_code == 200
         assert test_collection.name.encode() in response.data
 
+    def test_view_collection_not_modified(self, client, test_collection):
+        """Test that a repeat view with a matching ETag returns 304."""
+        response = client.get(f'/collections/{test_collection.uuid}')
+        etag = response.headers.get('ETag')
+        assert etag is not None
+
+        response = client.get(f'/collections/{test_collection.uuid}',
+                              headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+
     def test_view_collection_not_found(self, client):
         """Test viewing a non-existent collection."""
         fake_uuid = '12345678-1234-1234-1234-123456789012'
@@ -197,14 +185,225 @@ class TestCollectionRoutes:
 
     def test_collections_index_shows_user_collections(self, client, test_user, test_collection):
         """Test collections index shows user's collections."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         response = client.get('/collections/')
         assert response.status_code == 200
         assert test_collection.name.encode() in response.data
 
+    def test_file_routes_enforce_collection_access(self, client, app, test_collection, make_file):
+        """Test that file routes redirect for passwords and return 410 once expired."""
+        # Use the app-level session that requests share, not a fresh app context
+        collection = db.session.get(Collection, test_collection.id)
+        file = make_file(collection, 'guarded.jpg')
+        collection.privacy = 'password'
+        collection.set_password('secret123')
+        db.session.commit()
+
+        for route in ('', '/thumbnail', '/preview', '/generate-thumbnail'):
+            response = client.get(f'/collections/files/{file.uuid}{route}')
+            assert response.status_code == 302
+            assert f'/collections/{collection.uuid}/password' in response.location
+
+        collection.privacy = 'unlisted'
+        collection.expires_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=1)
+        db.session.commit()
+
+        response = client.get(f'/collections/files/{file.uuid}/thumbnail')
+        assert response.status_code == 410
+
+    def test_collection_page_enforces_collection_access(self, client, app, test_collection):
+        """Test that the collection page shares the file routes' password and expiry guard."""
+        collection = db.session.get(Collection, test_collection.id)
+        collection.privacy = 'password'
+        collection.set_password('secret123')
+        db.session.commit()
+
+        response = client.get(f'/collections/{collection.uuid}')
+        assert response.status_code == 302
+        assert f'/collections/{collection.uuid}/password' in response.location
+
+        with client.session_transaction() as sess:
+            sess[f'collection_access_{collection.uuid}'] = True
+        assert client.get(f'/collections/{collection.uuid}').status_code == 200
+
+        collection.expires_at = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=1)
+        db.session.commit()
+        assert client.get(f'/collections/{collection.uuid}').status_code == 410
+
+    def test_collections_index_loads_files_in_one_query(self, client, test_user, app, make_file):
+        """Test that the index loads every collection's files with a single query."""
+        for i in range(3):
+            collection = Collection(name=f'Batch {i}', privacy='unlisted', user_id=test_user.id)
+            db.session.add(collection)
+            db.session.commit()
+            make_file(collection, f'{i}.jpg')
+
+        login_as(client, test_user)
+
+        with count_queries(lambda statement: 'FROM files' in statement) as file_queries:
+            response = client.get('/collections/')
+
+        assert response.status_code == 200
+        assert b'Batch 2' in response.data
+        assert len(file_queries) == 1
+
+    def test_view_collection_loads_files_with_collection(self, client, test_collection, make_file):
+        """Test that viewing a collection fetches it and its files in one query."""
+        for i in range(3):
+            make_file(test_collection, f'view_{i}.jpg')
+        url = f'/collections/{test_collection.uuid}'
+
+        def selects_collection_or_files(statement):
+            return statement.startswith('SELECT') and ('FROM files' in statement or 'FROM collections' in statement)
+
+        with count_queries(selects_collection_or_files) as queries:
+            response = client.get(url)
+
+        assert response.status_code == 200
+        assert b'view_2.jpg' in response.data
+        assert len(queries) == 1
+
+    def test_local_file_served_through_x_accel_redirect(self, client, app, test_collection, tmp_path,
+                                                        make_file):
+        """Test that nginx is handed the file path instead of the body when configured."""
+        (tmp_path / 'uploads').mkdir()
+        (tmp_path / 'uploads' / 'accel.jpg').write_bytes(b'jpeg-bytes')
+
+        file = make_file(test_collection, 'accel.jpg', original_filename='my photo.jpg', size=10)
+
+        with patch.object(app, 'instance_path', str(tmp_path)), \
+             patch.dict(app.config, {'STORAGE_BACKEND': 'local', 'X_ACCEL_REDIRECT_PREFIX': '/_protected/'}):
+            response = client.get(f'/collections/files/{file.uuid}')
+
+        assert response.status_code == 200
+        assert response.data == b''
+        assert response.headers['X-Accel-Redirect'] == '/_protected/uploads/accel.jpg'
+        assert response.headers['Content-Disposition'] == 'attachment; filename="my photo.jpg"'
+        assert response.mimetype == 'image/jpeg'
+
+    def test_local_file_download_supports_range_requests(self, client, app, test_collection, tmp_path,
+                                                         make_file):
+        """Test that local downloads can be resumed with a Range request."""
+        (tmp_path / 'uploads').mkdir()
+        (tmp_path / 'uploads' / 'range.jpg').write_bytes(b'0123456789')
+
+        file = make_file(test_collection, 'range.jpg', size=10)
+
+        with patch.object(app, 'instance_path', str(tmp_path)), \
+             patch.dict(app.config, {'STORAGE_BACKEND': 'local', 'X_ACCEL_REDIRECT_PREFIX': None}):
+            full = client.get(f'/collections/files/{file.uuid}')
+            partial = client.get(f'/collections/files/{file.uuid}', headers={
+                'Range': 'bytes=4-',
+                'If-Range': full.headers['ETag']
+            })
+
+        assert full.headers['ETag'].startswith(f'"{file.uuid}-')
+        assert partial.status_code == 206
+        assert partial.data == b'456789'
+        assert partial.headers['Content-Range'] == 'bytes 4-9/10'
+        assert full.cache_control.public is False
+
+    def test_static_assets_are_cacheable(self, client):
+        """Test that static assets get a browser cache lifetime while uploads do not."""
+        response = client.get('/collections/static/css/upload.css')
+
+        assert response.status_code == 200
+        assert response.cache_control.max_age == 3600
+
+    def test_missing_local_file_returns_404(self, client, app, test_collection, tmp_path, make_file):
+        """Test that a record whose file is gone from disk answers 404."""
+        file = make_file(test_collection, 'gone.jpg', size=10)
+
+        with patch.object(app, 'instance_path', str(tmp_path)), \
+             patch.dict(app.config, {'STORAGE_BACKEND': 'local', 'X_ACCEL_REDIRECT_PREFIX': None}):
+            response = client.get(f'/collections/files/{file.uuid}')
+
+        assert response.status_code == 404
+
+    def test_thumbnail_redirect_is_cacheable(self, client, app, test_collection, make_file):
+        """Test that thumbnail redirects are privately cacheable and never revalidate to a stale URL."""
+        file = make_file(test_collection, 'cached.jpg', size=10,
+                         storage_path='collections/test/cached.jpg',
+                         thumb_path='collections/test/cached_thumb.jpg',
+                         storage_backend='r2')
+
+        mock_r2_storage = MagicMock()
+        mock_r2_storage.generate_presigned_url.side_effect = [
+            'https://r2.example.com/cached_thumb.jpg?signed=1',
+            'https://r2.example.com/cached_thumb.jpg?signed=2'
+        ]
+
+        with patch.dict(app.config, {'STORAGE_BACKEND': 'r2'}), \
+             patch.object(app, 'r2_storage', mock_r2_storage, create=True):
+            response = client.get(f'/collections/files/{file.uuid}/thumbnail')
+
+            assert response.status_code == 302
+            assert response.location == 'https://r2.example.com/cached_thumb.jpg?signed=1'
+            assert response.cache_control.private is True
+            assert response.cache_control.max_age == 3600
+            assert 'ETag' not in response.headers
+
+            # A browser revalidating its expired copy gets the re-signed URL, not a 304
+            response = client.get(f'/collections/files/{file.uuid}/thumbnail',
+                                  headers={'If-None-Match': 'W/"cached"'})
+            assert response.status_code == 302
+            assert response.location == 'https://r2.example.com/cached_thumb.jpg?signed=2'
+
+    def test_local_thumbnail_revalidates_to_not_modified(self, client, app, test_collection, tmp_path,
+                                                         make_file):
+        """Test that a cached local thumbnail is revalidated with a 304 and no body."""
+        (tmp_path / 'uploads').mkdir()
+        (tmp_path / 'uploads' / 'local_thumb.jpg').write_bytes(b'thumbnail')
+
+        file = make_file(test_collection, 'local.jpg', size=10, thumb_path='uploads/local_thumb.jpg')
+
+        with patch.object(app, 'instance_path', str(tmp_path)), \
+             patch.dict(app.config, {'STORAGE_BACKEND': 'local', 'X_ACCEL_REDIRECT_PREFIX': None}):
+            response = client.get(f'/collections/files/{file.uuid}/thumbnail')
+            assert response.status_code == 200
+            assert response.cache_control.max_age == 3600
+
+            response = client.get(f'/collections/files/{file.uuid}/thumbnail',
+                                  headers={'If-None-Match': response.headers['ETag']})
+
+        assert response.status_code == 304
+        assert response.data == b''
+
+    def test_missing_thumbnail_queues_generation_and_shows_placeholder(self, client, app, test_collection,
+                                                                       make_file):
+        """Test that a file without a thumbnail gets a placeholder while one is generated."""
+        file = make_file(test_collection, 'pending.jpg', size=10)
+        file_id = file.id
+
+        with patch('app.views.collections.collections_routes.enqueue_variant_generation') as mock_enqueue:
+            response = client.get(f'/collections/files/{file.uuid}/thumbnail')
+
+        assert response.status_code == 200
+        assert response.mimetype == 'image/svg+xml'
+        assert response.cache_control.no_cache
+        mock_enqueue.assert_called_once_with([file_id])
+
+    def test_public_file_redirect_is_shared_cacheable(self, client, app, test_collection, make_file):
+        """Test that R2 redirects for public collections can be kept by shared caches."""
+        test_collection.privacy = 'public'
+        file = make_file(test_collection, 'public.jpg', size=10,
+                         storage_path='collections/test/public.jpg', storage_backend='r2')
+
+        mock_r2_storage = MagicMock()
+        mock_r2_storage.generate_presigned_url.return_value = 'https://r2.example.com/public.jpg'
+
+        with patch.dict(app.config, {'STORAGE_BACKEND': 'r2'}), \
+             patch.object(app, 'r2_storage', mock_r2_storage, create=True):
+            response = client.get(f'/collections/files/{file.uuid}')
+
+        assert response.status_code == 302
+        assert response.cache_control.public is True
+        assert response.cache_control.private is None
+        assert response.cache_control.immutable is False
+        assert response.cache_control.max_age == 3600
+        assert mock_r2_storage.generate_presigned_url.call_args.kwargs['expiry_seconds'] == 7200
+
 
 class TestFileValidationAPI:
     """Test file validation API endpoint."""
@@ -217,9 +416,7 @@ class TestFileValidationAPI:
 
     def test_validate_valid_files(self, client, test_user):
         """Test validation of valid image files."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         files_data = [
             {
@@ -245,9 +442,7 @@ class TestFileValidationAPI:
 
     def test_validate_invalid_file_type(self, client, test_user):
         """Test validation rejects invalid file types."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         files_data = [
             {
@@ -267,9 +462,7 @@ class TestFileValidationAPI:
 
     def test_validate_file_too_large(self, client, test_user):
         """Test validation rejects files that are too large."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         files_data = [
             {
@@ -289,9 +482,7 @@ class TestFileValidationAPI:
 
     def test_validate_too_many_files(self, client, test_user):
         """Test validation rejects too many files."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         # Create 101 files (over 100 limit)
         files_data = [
@@ -312,9 +503,7 @@ class TestFileValidationAPI:
 
     def test_validate_total_size_too_large(self, client, test_user):
         """Test validation rejects when total size exceeds R2 limit."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         # Create files totaling over 10GB (updated limit)
         files_data = [
@@ -333,6 +522,17 @@ class TestFileValidationAPI:
         assert data['success'] is False
         assert '10GB' in data['error']  # Updated error message
 
+    def test_validate_oversized_request_body(self, client, test_user):
+        """Test that a validation body far beyond a full batch is refused before parsing."""
+        login_as(client, test_user)
+
+        files_data = [{'name': 'x' * 4096 + '.jpg', 'type': 'image/jpeg', 'size': 1024}] * 100
+
+        response = client.post('/collections/api/validate-files', json={'files': files_data})
+
+        assert response.status_code == 413
+        assert response.get_json()['success'] is False
+
 
 class TestFileUploadAPI:
     """Test file upload API endpoint."""
@@ -344,9 +544,7 @@ class TestFileUploadAPI:
 
     def test_upload_files_requires_collection_id(self, client, test_user):
         """Test that upload requires a valid collection ID."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         response = client.post('/collections/api/upload-files')
 
@@ -355,11 +553,27 @@ class TestFileUploadAPI:
         assert data['success'] is False
         assert 'Collection ID required' in data['error']
 
+    def test_upload_files_rejects_body_over_limit(self, client, app, test_user, test_collection, sample_image):
+        """Test that a body over MAX_CONTENT_LENGTH gets a JSON 413 without being uploaded."""
+        login_as(client, test_user)
+
+        data = {
+            'collection_id': str(test_collection.id),
+            'files': (sample_image, 'test.jpg', 'image/jpeg')
+        }
+
+        with patch.dict(app.config, {'MAX_CONTENT_LENGTH': 64}), \
+                patch('app.services.storage_service.StorageService.submit_upload') as mock_submit:
+            response = client.post('/collections/api/upload-files', data=data,
+                                   content_type='multipart/form-data')
+
+        assert response.status_code == 413
+        assert response.get_json()['success'] is False
+        mock_submit.assert_not_called()
+
     def test_upload_files_invalid_collection(self, client, test_user):
         """Test upload with invalid collection ID."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         response = client.post('/collections/api/upload-files',
                               data={'collection_id': 99999})
@@ -369,11 +583,64 @@ class TestFileUploadAPI:
         assert data['success'] is False
         assert 'not found' in data['error']
 
+    def test_upload_files_unknown_collection_after_file(self, client, test_user, sample_image):
+        """Test that files held for a collection that turns out not to exist are closed, not uploaded."""
+        from werkzeug.test import encode_multipart
+
+        login_as(client, test_user)
+        boundary, body = encode_multipart({
+            'file_test': FileStorage(sample_image, filename='early.jpg', content_type='image/jpeg'),
+            'collection_id': '99999'
+        })
+        spools = []
+
+        def make_spool(**kwargs):
+            spools.append(SpooledTemporaryFile(**kwargs))
+            return spools[-1]
+
+        with patch('app.services.upload_stream.SpooledTemporaryFile', side_effect=make_spool), \
+             patch('app.services.storage_service.StorageService.submit_upload') as mock_submit:
+            response = client.post('/collections/api/upload-files', data=body,
+                                   content_type=f'multipart/form-data; boundary={boundary}')
+
+        assert response.status_code == 404
+        mock_submit.assert_not_called()
+        assert len(spools) == 1
+        assert spools[0].closed
+
+    def test_upload_files_truncated_body_deletes_stored_uploads(self, client, test_user, test_collection,
+                                                                make_file):
+        """Test that a body cut off part way through is rejected and its finished uploads are deleted."""
+        from werkzeug.test import encode_multipart
+        from app.services.storage_service import StorageService
+
+        login_as(client, test_user)
+        boundary, body = encode_multipart({
+            'collection_id': str(test_collection.id),
+            'file_a': FileStorage(BytesIO(b'%PDF-1.4'), filename='a.pdf'),
+            'file_b': FileStorage(BytesIO(b'b' * 4096), filename='b.pdf'),
+        })
+
+        def fake_upload(file_obj, filename, collection, progress_callback=None):
+            return {
+                'success': True,
+                'file_record': make_file(collection, filename, save=False, mime_type='application/pdf'),
+                'error': None,
+                'storage_info': {'upload_method': 'local'}
+            }
+
+        with patch.object(StorageService, '_upload_to_local', side_effect=fake_upload), \
+             patch.object(StorageService, 'delete_path') as mock_delete:
+            response = client.post('/collections/api/upload-files', data=body[:-2048],
+                                   content_type=f'multipart/form-data; boundary={boundary}')
+
+        assert response.status_code == 400
+        mock_delete.assert_called_once_with('uploads/a.pdf')
+        assert File.query.filter_by(collection_id=test_collection.id).count() == 0
+
     def test_upload_files_success(self, client, test_user, test_collection, sample_image, app):
         """Test successful file upload."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         # Create a FileStorage object
         sample_image.seek(0)
@@ -413,10 +680,69 @@ class TestFileUploadAPI:
             assert data['success'] is True
             assert len(data['uploaded_files']) == 1
             assert data['uploaded_files'][0]['filename'] == 'test_photo.jpg'
+            assert data['uploaded_files'][0]['uuid'] is not None
+            assert data['uploaded_files'][0]['uuid'] == str(mock_file_record.uuid)
 
             # Verify the upload method was called
             mock_upload.assert_called_once()
 
+    def test_upload_files_deletes_variants_when_commit_fails(self, client, test_user, test_collection,
+                                                               sample_image, make_file):
+        """Test that originals and variants stored during a failed upload request do not stay in storage."""
+        from app.services.storage_service import StorageService
+        from app.services.thumbnail_service import ThumbnailService
+
+        login_as(client, test_user)
+        file_record = make_file(test_collection, 'orphan.jpg', save=False,
+                                storage_backend='local', upload_complete=True)
+        variant_paths = {'thumb_path': 'uploads/variants/orphan_thumb.jpg',
+                         'medium_path': 'uploads/variants/orphan_medium.jpg'}
+
+        with patch.object(StorageService, '_upload_to_local', return_value={
+                'success': True, 'file_record': file_record, 'error': None,
+                'storage_info': {'upload_method': 'local', 'path': '/fake/path'}}), \
+             patch.object(ThumbnailService, 'encode_variants',
+                          return_value={'variant_paths': variant_paths, 'errors': []}), \
+             patch.object(StorageService, 'delete_path') as mock_delete, \
+             patch.object(db.session, 'commit', side_effect=RuntimeError('database is locked')):
+            response = client.post('/collections/api/upload-files', data={
+                'collection_id': test_collection.id,
+                'file_test': (sample_image, 'orphan.jpg', 'image/jpeg')
+            })
+
+        assert response.status_code == 500
+        deleted = sorted(call.args[0] for call in mock_delete.call_args_list)
+        assert deleted == sorted(['uploads/orphan.jpg', *variant_paths.values()])
+
+    def test_upload_files_does_not_requery_by_uuid(self, client, test_user, test_collection, sample_image,
+                                                   make_file):
+        """Test that uploaded records are reused rather than looked up again by UUID."""
+        login_as(client, test_user)
+
+        def fake_upload(file_obj, filename, collection, progress_callback=None):
+            return {
+                'success': True,
+                'file_record': make_file(collection, filename, save=False, mime_type='application/pdf',
+                                         storage_backend='local', upload_complete=True),
+                'error': None,
+                'storage_info': {'upload_method': 'local'}
+            }
+
+        def selects_file_by_uuid(statement):
+            return statement.startswith('SELECT') and 'files.uuid =' in statement
+
+        with count_queries(selects_file_by_uuid) as statements, \
+             patch('app.services.storage_service.StorageService._upload_to_local', side_effect=fake_upload):
+            response = client.post('/collections/api/upload-files', data={
+                'collection_id': test_collection.id,
+                'file_a': FileStorage(stream=BytesIO(b'%PDF-1.4'), filename='a.pdf'),
+                'file_b': FileStorage(stream=BytesIO(b'%PDF-1.4'), filename='b.pdf'),
+            })
+
+        assert response.status_code == 200
+        assert len(response.get_json()['uploaded_files']) == 2
+        assert statements == []
+
 
 class TestCollectionModel:
     """Test Collection model functionality."""
@@ -524,29 +850,35 @@ class TestFileModel:
             assert file.original_filename == 'my_photo.jpg'
             assert file.collection_id == test_collection.id
 
-    def test_file_size_human(self, app, test_collection):
-        """Test human-readable file size formatting."""
+    def test_files_inserted_in_one_statement(self, app, test_collection, make_file):
+        """Test that a batch of new files is written with a single INSERT."""
         with app.app_context():
-            # Test different file sizes
-            test_cases = [
-                (512, '512 B'),
-                (1024, '1.0 KB'),
-                (1536, '1.5 KB'),
-                (1024 * 1024, '1.0 MB'),
-                (1.5 * 1024 * 1024, '1.5 MB'),
-                (1024 * 1024 * 1024, '1.0 GB'),
-            ]
-
-            for size_bytes, expected in test_cases:
-                file = File(
-                    filename='test.jpg',
-                    original_filename='test.jpg',
-                    mime_type='image/jpeg',
-                    size=int(size_bytes),
-                    storage_path='/test.jpg',
-                    collection_id=test_collection.id
-                )
-                assert file.size_human == expected
+            files = [make_file(test_collection, f'batch_{i}.jpg', save=False) for i in range(10)]
+
+            with count_queries(lambda statement: statement.startswith('INSERT INTO files')) as statements:
+                db.session.add_all(files)
+                db.session.flush()
+
+            assert len(statements) == 1
+            assert all(f.id is not None and f.uuid is not None for f in files)
+            assert len({f.id for f in files}) == 10
+
+            db.session.commit()
+
+    def test_file_size_human(self):
+        """Test human-readable file size formatting."""
+        # size_human only formats the size, so unsaved files without a collection will do
+        test_cases = [
+            (512, '512 B'),
+            (1024, '1.0 KB'),
+            (1536, '1.5 KB'),
+            (1024 * 1024, '1.0 MB'),
+            (1.5 * 1024 * 1024, '1.5 MB'),
+            (1024 * 1024 * 1024, '1.0 GB'),
+        ]
+
+        for size_bytes, expected in test_cases:
+            assert File(size=int(size_bytes)).size_human == expected, size_bytes
 
 
 class TestCollectionForms:
@@ -555,8 +887,6 @@ class TestCollectionForms:
     def test_collection_form_validation(self, app):
         """Test collection form validation."""
         with app.app_context():
-            from app.forms import CollectionForm
-
             # Valid form data
             form = CollectionForm(data={
                 'name': 'My Collection',
@@ -571,8 +901,6 @@ class TestCollectionForms:
     def test_collection_form_required_fields(self, app):
         """Test collection form required field validation."""
         with app.app_context():
-            from app.forms import CollectionForm
-
             # Missing required name
             form = CollectionForm(data={
                 'name': '',
@@ -590,67 +918,63 @@ class TestCollectionWorkflow:
 
     def test_complete_upload_workflow(self, client, test_user, sample_image, app):
         """Test complete workflow from collection creation to file upload."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(test_user.id)
-            sess['_fresh'] = True
+        login_as(client, test_user)
 
         # Step 1: Create collection
         form_data = {
             'name': 'Workflow Test Collection',
             'description': 'Testing complete workflow',
-            'privacy': 'unlisted',
-            'csrf_token': 'test'
+            'privacy': 'unlisted'
         }
 
-        with patch('flask_wtf.csrf.validate_csrf', return_value=True):
-            response = client.post('/collections/upload', data=form_data, follow_redirects=False)
+        response = client.post('/collections/upload', data=form_data, follow_redirects=False)
 
-            # Should redirect to collection view
-            assert response.status_code == 302
+        # Should redirect to collection view
+        assert response.status_code == 302
 
-            with app.app_context():
-                collection = Collection.query.filter_by(name='Workflow Test Collection').first()
-                assert collection is not None
+        with app.app_context():
+            collection = Collection.query.filter_by(name='Workflow Test Collection').first()
+            assert collection is not None
+
+            # Step 2: Upload file
+            sample_image.seek(0)
+            file_storage = FileStorage(
+                stream=sample_image,
+                filename='workflow_test.jpg',
+                content_type='image/jpeg'
+            )
 
-                # Step 2: Upload file
-                sample_image.seek(0)
-                file_storage = FileStorage(
-                    stream=sample_image,
-                    filename='workflow_test.jpg',
-                    content_type='image/jpeg'
+            with patch('app.services.storage_service.StorageService._upload_to_local') as mock_upload:
+                # Mock the upload method to return a successful result
+                mock_file_record = File(
+                    filename='workflow_uuid.jpg',
+                    original_filename='workflow_test.jpg',
+                    mime_type='image/jpeg',
+                    size=1024,
+                    storage_path='uploads/test_collection_uuid/workflow_uuid.jpg',
+                    storage_backend='local',
+                    upload_complete=True,
+                    collection_id=collection.id
                 )
-
-                with patch('app.services.storage_service.StorageService._upload_to_local') as mock_upload:
-                    # Mock the upload method to return a successful result
-                    mock_file_record = File(
-                        filename='workflow_uuid.jpg',
-                        original_filename='workflow_test.jpg',
-                        mime_type='image/jpeg',
-                        size=1024,
-                        storage_path='uploads/test_collection_uuid/workflow_uuid.jpg',
-                        storage_backend='local',
-                        upload_complete=True,
-                        collection_id=collection.id
-                    )
-                    mock_upload.return_value = {
-                        'success': True,
-                        'file_record': mock_file_record,
-                        'error': None,
-                        'storage_info': {'upload_method': 'local', 'path': '/fake/path'}
-                    }
-
-                    upload_response = client.post('/collections/api/upload-files',
-                                                data={
-                                                    'collection_id': collection.id,
-                                                    'file_test': file_storage
-                                                })
-
-                    assert upload_response.status_code == 200
-
-                    # Step 3: Verify the upload method was called
-                    mock_upload.assert_called_once()
-
-                # Step 4: View collection
-                view_response = client.get(f'/collections/{collection.uuid}')
-                assert view_response.status_code == 200
-                assert collection.name.encode() in view_response.data
\ No newline at end of file
+                mock_upload.return_value = {
+                    'success': True,
+                    'file_record': mock_file_record,
+                    'error': None,
+                    'storage_info': {'upload_method': 'local', 'path': '/fake/path'}
+                }
+
+                upload_response = client.post('/collections/api/upload-files',
+                                              data={
+                                                  'collection_id': collection.id,
+                                                  'file_test': file_storage
+                                              })
+
+                assert upload_response.status_code == 200
+
+                # Step 3: Verify the upload method was called
+                mock_upload.assert_called_once()
+
+            # Step 4: View collection
+            view_response = client.get(f'/collections/{collection.uuid}')
+            assert view_response.status_code == 200
+            assert collection.name.encode() in view_response.data
\ No newline at end of file
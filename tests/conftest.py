@@ -4,16 +4,18 @@ Test configuration and shared fixtures for The Open Harbor test suite.
 
 import os
 import pytest
-import tempfile
+
+# Every app built by the tests, in any order or xdist worker, gets TestingConfig and
+# its in-memory database. config.py reads these when imported, so set them first
+os.environ.setdefault('FLASK_ENV', 'testing')
+os.environ.setdefault('TSH_SECRET_KEY', 'test-secret-key-for-testing-only')
+
 from app import create_app
 
 
 @pytest.fixture(scope='session')
 def app():
     """Create application for the tests."""
-    # Set environment to use testing config BEFORE creating app
-    os.environ['FLASK_ENV'] = 'testing'
-
     app = create_app('testing')
 
     # Additional test-specific config
@@ -25,9 +27,8 @@ def app():
     ctx = app.app_context()
     ctx.push()
 
-    # Import and create tables (they should already be created by create_app, but ensure)
-    from app.models import db
-    db.create_all()
+    # create_app has already created the tables in the in-memory database, which
+    # every app context shares, so the schema is not checked again here
 
     yield app
 
@@ -35,12 +36,44 @@ def app():
     ctx.pop()
 
 
+@pytest.fixture(scope='function')
+def db_session(app):
+    """
+    Database session for a test that leaves the shared database empty afterwards.
+
+    The session-wide app keeps one in-memory database, so rows are deleted
+    after the test instead of rebuilding the schema for each one.
+    """
+    from flask import g
+    from app.models import db
+
+    yield db.session
+
+    # Requests share the pushed app context, so drop the user Flask-Login cached on g
+    g.pop('_login_user', None)
+
+    db.session.rollback()
+    for table in reversed(db.metadata.sorted_tables):
+        db.session.execute(table.delete())
+    db.session.commit()
+    # Bulk deletes leave the deleted objects in the identity map, where rows
+    # reusing their ids in the next test would collide with them
+    db.session.expunge_all()
+
+
 @pytest.fixture(scope='session')
 def client(app):
     """Create a test client for the app."""
     return app.test_client()
 
 
+@pytest.fixture(autouse=True)
+def _clear_session_cookie(client):
+    """Drop the session cookie after each test so the shared client starts every test as a guest."""
+    yield
+    client.delete_cookie('session')
+
+
 @pytest.fixture(scope='session')
 def runner(app):
     """Create a test runner for the app's CLI commands."""
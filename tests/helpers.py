@@ -0,0 +1,67 @@
+"""
+Helpers shared by The Open Harbor test modules.
+"""
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.models import db
+
+# A minimal 1x1 pixel JPEG. Built once; fixtures hand out BytesIO copies of it
+SAMPLE_JPEG = bytes([
+    0xFF, 0xD8, 0xFF, 0xE0, 0x00, 0x10, 0x4A, 0x46, 0x49, 0x46, 0x00, 0x01,
+    0x01, 0x01, 0x00, 0x48, 0x00, 0x48, 0x00, 0x00, 0xFF, 0xDB, 0x00, 0x43,
+    0x00, 0x08, 0x06, 0x06, 0x07, 0x06, 0x05, 0x08, 0x07, 0x07, 0x07, 0x09,
+    0x09, 0x08, 0x0A, 0x0C, 0x14, 0x0D, 0x0C, 0x0B, 0x0B, 0x0C, 0x19, 0x12,
+    0x13, 0x0F, 0x14, 0x1D, 0x1A, 0x1F, 0x1E, 0x1D, 0x1A, 0x1C, 0x1C, 0x20,
+    0x24, 0x2E, 0x27, 0x20, 0x22, 0x2C, 0x23, 0x1C, 0x1C, 0x28, 0x37, 0x29,
+    0x2C, 0x30, 0x31, 0x34, 0x34, 0x34, 0x1F, 0x27, 0x39, 0x3D, 0x38, 0x32,
+    0x3C, 0x2E, 0x33, 0x34, 0x32, 0xFF, 0xC0, 0x00, 0x11, 0x08, 0x00, 0x01,
+    0x00, 0x01, 0x01, 0x01, 0x11, 0x00, 0x02, 0x11, 0x01, 0x03, 0x11, 0x01,
+    0xFF, 0xC4, 0x00, 0x14, 0x00, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x08, 0xFF, 0xC4,
+    0x00, 0x14, 0x10, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
+    0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xFF, 0xDA, 0x00, 0x0C,
+    0x03, 0x01, 0x00, 0x02, 0x11, 0x03, 0x11, 0x00, 0x3F, 0x00, 0xB2, 0xC0,
+    0x07, 0xFF, 0xD9
+])
+
+
+# Signed session cookies by user id, so each login is only serialised and signed once
+_session_cookies = {}
+
+
+def login_as(client, user):
+    """Give the client a fresh session logged in as user."""
+    cookie = _session_cookies.get(user.id)
+    if cookie is None:
+        with client.session_transaction() as sess:
+            sess.clear()
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+        _session_cookies[user.id] = client.get_cookie('session').value
+    else:
+        client.set_cookie('session', cookie)
+
+
+def assert_all_in(data, *needles):
+    """Assert that every needle occurs in data, reporting all missing ones at once."""
+    missing = [needle for needle in needles if needle not in data]
+    assert not missing, f"Missing from response: {missing}"
+
+
+@contextmanager
+def count_queries(matches=lambda statement: True):
+    """Collect the SQL statements matching a predicate that run inside the block."""
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if matches(statement):
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
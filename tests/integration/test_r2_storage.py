@@ -6,6 +6,8 @@ Tests the full R2 integration including storage service, file uploads, and error
 import pytest
 import io
 import json
+import time
+from uuid import UUID
 from unittest.mock import patch, MagicMock, Mock
 from werkzeug.datastructures import FileStorage
 from botocore.exceptions import ClientError
@@ -14,6 +16,7 @@ from app import create_app
 from app.models import db, User, Collection, File
 from app.services.storage_service import StorageService
 from app.integrations.file_storage import CloudflareR2Storage, ValidationError, UploadError
+from tests.helpers import SAMPLE_JPEG, login_as
 
 
 @pytest.fixture(scope='function')
@@ -93,26 +96,7 @@ def mock_r2_config():
 @pytest.fixture
 def sample_image_file():
     """Create a sample image file for testing."""
-    # Create a minimal JPEG file (1x1 pixel)
-    jpeg_data = bytes([
-        0xFF, 0xD8, 0xFF, 0xE0, 0x00, 0x10, 0x4A, 0x46, 0x49, 0x46, 0x00, 0x01,
-        0x01, 0x01, 0x00, 0x48, 0x00, 0x48, 0x00, 0x00, 0xFF, 0xDB, 0x00, 0x43,
-        0x00, 0x08, 0x06, 0x06, 0x07, 0x06, 0x05, 0x08, 0x07, 0x07, 0x07, 0x09,
-        0x09, 0x08, 0x0A, 0x0C, 0x14, 0x0D, 0x0C, 0x0B, 0x0B, 0x0C, 0x19, 0x12,
-        0x13, 0x0F, 0x14, 0x1D, 0x1A, 0x1F, 0x1E, 0x1D, 0x1A, 0x1C, 0x1C, 0x20,
-        0x24, 0x2E, 0x27, 0x20, 0x22, 0x2C, 0x23, 0x1C, 0x1C, 0x28, 0x37, 0x29,
-        0x2C, 0x30, 0x31, 0x34, 0x34, 0x34, 0x1F, 0x27, 0x39, 0x3D, 0x38, 0x32,
-        0x3C, 0x2E, 0x33, 0x34, 0x32, 0xFF, 0xC0, 0x00, 0x11, 0x08, 0x00, 0x01,
-        0x00, 0x01, 0x01, 0x01, 0x11, 0x00, 0x02, 0x11, 0x01, 0x03, 0x11, 0x01,
-        0xFF, 0xC4, 0x00, 0x14, 0x00, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x08, 0xFF, 0xC4,
-        0x00, 0x14, 0x10, 0x01, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00,
-        0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0x00, 0xFF, 0xDA, 0x00, 0x0C,
-        0x03, 0x01, 0x00, 0x02, 0x11, 0x03, 0x11, 0x00, 0x3F, 0x00, 0xB2, 0xC0,
-        0x07, 0xFF, 0xD9
-    ])
-
-    return io.BytesIO(jpeg_data)
+    return io.BytesIO(SAMPLE_JPEG)
 
 
 class TestR2StorageService:
@@ -138,6 +122,62 @@ class TestR2StorageService:
             assert storage.backend == 'r2'
             assert storage.r2_storage is not None
 
+    def test_storage_service_shared_per_app(self, app):
+        """Test that the shared service is reused until the backend config changes."""
+        from app.services.storage_service import get_storage_service
+
+        with app.app_context():
+            with patch.dict(app.config, {'STORAGE_BACKEND': 'local'}):
+                first = get_storage_service()
+                assert get_storage_service() is first
+
+            with patch.dict(app.config, {'STORAGE_BACKEND': 'r2'}):
+                rebuilt = get_storage_service()
+                assert rebuilt is not first
+                assert rebuilt.backend == 'r2'
+
+    def test_submitted_uploads_run_concurrently(self, app, r2_test_collection):
+        """Test that files submitted in one request upload in parallel on the shared pool."""
+        import threading
+
+        both_started = threading.Barrier(2, timeout=5)
+
+        def upload(file_obj, filename, collection, progress_callback=None):
+            both_started.wait()
+            return {'success': True, 'file_record': None, 'error': None, 'storage_info': None}
+
+        with app.app_context():
+            storage = StorageService()
+            with patch.object(storage, 'upload_file', side_effect=upload):
+                futures = [
+                    storage.submit_upload(io.BytesIO(b'data'), f'{name}.jpg', r2_test_collection)
+                    for name in ('first', 'second')
+                ]
+                results = [future.result(timeout=10) for future in futures]
+
+        assert all(result['success'] for result in results)
+
+    def test_batch_upload_binds_progress_per_file(self, app, r2_test_collection):
+        """Test that batch progress carries each file's index and is skipped without a callback."""
+        seen = []
+        result = {'success': True, 'file_record': None, 'error': None, 'storage_info': None}
+        files_data = [{'file_obj': io.BytesIO(b'data'), 'filename': f'{i}.jpg'} for i in range(2)]
+
+        with app.app_context():
+            storage = StorageService()
+            storage.backend = 'r2'
+            storage.r2_storage = MagicMock()
+            with patch.object(storage, 'upload_file', return_value=result) as mock_upload:
+                storage.batch_upload(files_data, r2_test_collection)
+                assert all(c.kwargs['progress_callback'] is None for c in mock_upload.call_args_list)
+
+                storage.batch_upload(files_data, r2_test_collection,
+                                     progress_callback=lambda *args: seen.append(args))
+                for c in mock_upload.call_args_list[2:]:
+                    c.kwargs['progress_callback'](512, 1024)
+
+        assert seen == [(0, 2, 512, 1024), (1, 2, 512, 1024)]
+
     def test_file_upload_to_r2(self, app, r2_test_collection, sample_image_file, mock_r2_client, mock_r2_config):
         """Test file upload to R2 storage."""
         with app.app_context():
@@ -169,6 +209,80 @@ class TestR2StorageService:
                 assert result['file_record'].original_filename == 'test.jpg'
                 assert result['file_record'].collection_id == r2_test_collection.id
 
+    def test_upload_uses_parallel_transfer_config(self, mock_r2_client, mock_r2_config, sample_image_file):
+        """Test that uploads hand boto3 the multipart transfer configuration."""
+        from app.integrations.file_storage import TRANSFER_CONFIG
+
+        r2_storage = CloudflareR2Storage()
+        result = r2_storage.upload_single_file(sample_image_file, filename='test.jpg')
+
+        assert result['upload_method'] == 'single_part'
+        assert mock_r2_client.upload_fileobj.call_args.kwargs['Config'] is TRANSFER_CONFIG
+        assert TRANSFER_CONFIG.max_concurrency > 1
+
+    def test_multipart_parts_uploaded_concurrently_in_order(self, mock_r2_client, mock_r2_config):
+        """Test that multipart parts are uploaded from a pool and completed in part order."""
+        from app.integrations.file_storage import MIN_PART_SIZE
+
+        mock_r2_client.create_multipart_upload.return_value = {'UploadId': 'upload-1'}
+        mock_r2_client.upload_part.side_effect = lambda **kwargs: {'ETag': f'"etag-{kwargs["PartNumber"]}"'}
+
+        data = io.BytesIO(b'x' * (MIN_PART_SIZE * 3 + 10))
+        r2_storage = CloudflareR2Storage()
+        result = r2_storage._multipart_upload(data, 'collections/test/big.jpg', {'ContentType': 'image/jpeg'})
+
+        assert result['upload_method'] == 'multipart'
+        assert mock_r2_client.upload_part.call_count == result['parts_count']
+        sent = sum(len(c.kwargs['Body']) for c in mock_r2_client.upload_part.call_args_list)
+        assert sent == MIN_PART_SIZE * 3 + 10
+
+        parts = mock_r2_client.complete_multipart_upload.call_args.kwargs['MultipartUpload']['Parts']
+        assert [p['PartNumber'] for p in parts] == list(range(1, result['parts_count'] + 1))
+        assert parts[0]['ETag'] == '"etag-1"'
+
+    def test_transient_errors_are_left_to_botocore_retries(self, mock_r2_client, mock_r2_config,
+                                                           sample_image_file):
+        """Test that R2 errors are retried by the client config, not again by a loop around it."""
+        unavailable = ClientError(
+            {'Error': {'Code': 'ServiceUnavailable'}, 'ResponseMetadata': {'HTTPStatusCode': 503}},
+            'PutObject'
+        )
+        mock_r2_client.upload_fileobj.side_effect = unavailable
+
+        with patch('app.integrations.file_storage.boto3.client', return_value=mock_r2_client) as mock_factory:
+            r2_storage = CloudflareR2Storage()
+        assert mock_factory.call_args.kwargs['config'].retries == {'mode': 'adaptive', 'max_attempts': 5}
+
+        # botocore has already used up its attempts by the time the error reaches us
+        with pytest.raises(UploadError):
+            r2_storage.upload_single_file(sample_image_file, filename='test.jpg')
+        assert mock_r2_client.upload_fileobj.call_count == 1
+
+    def test_connection_pool_follows_upload_workers(self, app, mock_r2_client, mock_r2_config):
+        """Test that the client gets a connection per part of every file the upload pool sends."""
+        from app.integrations.file_storage import TRANSFER_MAX_CONCURRENCY
+
+        with patch('app.integrations.file_storage.boto3.client', return_value=mock_r2_client) as mock_factory:
+            with patch.dict(app.config, {'UPLOAD_WORKERS': 2}):
+                CloudflareR2Storage()
+            CloudflareR2Storage(upload_workers=4)
+
+        pool_sizes = [call.kwargs['config'].max_pool_connections for call in mock_factory.call_args_list]
+        assert pool_sizes == [2 * TRANSFER_MAX_CONCURRENCY, 4 * TRANSFER_MAX_CONCURRENCY]
+
+    def test_permanent_upload_error_is_not_retried(self, mock_r2_client, mock_r2_config, sample_image_file):
+        """Test that client errors such as AccessDenied fail without retrying."""
+        mock_r2_client.upload_fileobj.side_effect = ClientError(
+            {'Error': {'Code': 'AccessDenied'}, 'ResponseMetadata': {'HTTPStatusCode': 403}},
+            'PutObject'
+        )
+
+        r2_storage = CloudflareR2Storage()
+        with pytest.raises(UploadError, match='Insufficient permissions'):
+            r2_storage.upload_single_file(sample_image_file, filename='test.jpg')
+
+        assert mock_r2_client.upload_fileobj.call_count == 1
+
     def test_file_upload_to_local_fallback(self, app, r2_test_collection, sample_image_file):
         """Test file upload falls back to local storage."""
         with app.app_context():
@@ -191,6 +305,26 @@ class TestR2StorageService:
                         assert result['file_record'].storage_backend == 'local'
                         assert result['file_record'].original_filename == 'test.jpg'
 
+    def test_upload_detects_mime_type_from_content(self, app, r2_test_collection, sample_image_file):
+        """Test that the stored MIME type comes from file content, not the filename."""
+        with app.app_context():
+            app.config['STORAGE_BACKEND'] = 'local'
+            app.r2_storage = None
+
+            storage = StorageService()
+
+            with patch('os.makedirs'):
+                with patch('builtins.open', create=True):
+                    with patch('os.path.getsize', return_value=1024):
+                        result = storage.upload_file(
+                            file_obj=sample_image_file,
+                            filename='mislabelled.png',
+                            collection=r2_test_collection
+                        )
+
+            assert result['success'] is True
+            assert result['file_record'].mime_type == 'image/jpeg'
+
     def test_upload_error_handling(self, app, r2_test_collection, sample_image_file, mock_r2_client, mock_r2_config):
         """Test error handling for R2 upload failures."""
         with app.app_context():
@@ -238,6 +372,48 @@ class TestR2StorageService:
             url = storage.generate_file_url(file_record, expiry_seconds=1800)
             assert url == 'https://example.com/file.jpg'
 
+    def test_presigned_urls_are_reused(self, mock_r2_client, mock_r2_config):
+        """Test that repeated presigns for the same key and expiry hit the cache."""
+        r2_storage = CloudflareR2Storage()
+
+        first = r2_storage.generate_presigned_url('collections/test/a.jpg', expiry_seconds=7200)
+        second = r2_storage.generate_presigned_url('collections/test/a.jpg', expiry_seconds=7200)
+        r2_storage.generate_presigned_url('collections/test/a.jpg', expiry_seconds=7200,
+                                          http_method='head_object')
+
+        assert first == second
+        assert mock_r2_client.generate_presigned_url.call_count == 2
+
+        with patch('app.integrations.file_storage.time.monotonic', return_value=time.monotonic() + 3601):
+            r2_storage.generate_presigned_url('collections/test/a.jpg', expiry_seconds=7200)
+
+        assert mock_r2_client.generate_presigned_url.call_count == 3
+
+    def test_cached_redirect_never_outlives_its_presigned_url(self, mock_r2_client, mock_r2_config):
+        """Test that a URL handed out from the cache still outlives a redirect cached for max-age."""
+        from app.views.collections.collections_routes import VARIANT_MAX_AGE, VARIANT_URL_EXPIRY
+
+        mock_r2_client.generate_presigned_url.side_effect = ['https://example.com/a.jpg?signed=1',
+                                                             'https://example.com/a.jpg?signed=2']
+        r2_storage = CloudflareR2Storage()
+        signed_at = 1000.0
+
+        with patch('app.integrations.file_storage.time.monotonic', return_value=signed_at):
+            first = r2_storage.generate_presigned_url('collections/test/a.jpg', expiry_seconds=VARIANT_URL_EXPIRY)
+
+        # Just under 3600s old: still handed out, and still valid for a full max-age
+        age = VARIANT_MAX_AGE - 0.5
+        with patch('app.integrations.file_storage.time.monotonic', return_value=signed_at + age):
+            assert r2_storage.generate_presigned_url('collections/test/a.jpg',
+                                                     expiry_seconds=VARIANT_URL_EXPIRY) == first
+        assert age + VARIANT_MAX_AGE <= VARIANT_URL_EXPIRY
+
+        # At 3600s old the URL is re-signed instead of handed out
+        with patch('app.integrations.file_storage.time.monotonic', return_value=signed_at + VARIANT_MAX_AGE):
+            second = r2_storage.generate_presigned_url('collections/test/a.jpg', expiry_seconds=VARIANT_URL_EXPIRY)
+
+        assert second == 'https://example.com/a.jpg?signed=2'
+
     def test_delete_file_r2(self, app, r2_test_collection, mock_r2_client, mock_r2_config):
         """Test file deletion from R2."""
         with app.app_context():
@@ -269,9 +445,7 @@ class TestR2UploadIntegration:
 
     def test_r2_upload_via_api(self, client, r2_test_user, r2_test_collection, sample_image_file, mock_r2_client):
         """Test R2 upload through the upload API endpoint."""
-        with client.session_transaction() as sess:
-            sess['_user_id'] = str(r2_test_user.id)
-            sess['_fresh'] = True
+        login_as(client, r2_test_user)
 
         # Mock the storage service to use R2 backend
         with patch('app.services.storage_service.StorageService._upload_to_r2') as mock_upload:
@@ -321,6 +495,138 @@ class TestR2UploadIntegration:
             assert len(data['uploaded_files']) == 1
             assert 'storage_info' in data['uploaded_files'][0]
 
+    def test_presign_unavailable_on_local_backend(self, app, client, r2_test_user, r2_test_collection):
+        """Test that presigning tells the client to fall back to proxied uploads."""
+        login_as(client, r2_test_user)
+
+        with patch.dict(app.config, {'STORAGE_BACKEND': 'local'}):
+            response = client.post('/collections/api/presign', json={
+                'collection_id': r2_test_collection.id,
+                'filename': 'test.jpg',
+                'content_type': 'image/jpeg',
+                'size': 1024
+            })
+
+        assert response.status_code == 400
+        assert response.get_json()['direct_upload'] is False
+
+    def test_direct_upload_presign_and_complete(self, app, client, r2_test_user, r2_test_collection,
+                                                mock_r2_client, mock_r2_config):
+        """Test presigning a browser upload and recording it afterwards."""
+        login_as(client, r2_test_user)
+
+        mock_r2_client.get_object.return_value = {'Body': io.BytesIO(b'\xff\xd8\xff\xe0 jpeg')}
+        with app.app_context():
+            r2_storage = CloudflareR2Storage()
+
+        with patch.dict(app.config, {'STORAGE_BACKEND': 'r2'}), \
+             patch.object(app, 'r2_storage', r2_storage, create=True), \
+             patch('app.views.collections.collections_routes.enqueue_variant_generation') as mock_enqueue:
+            response = client.post('/collections/api/presign', json={
+                'collection_id': r2_test_collection.id,
+                'filename': 'direct.jpg',
+                'content_type': 'image/jpeg',
+                'size': 1024
+            })
+
+            assert response.status_code == 200
+            upload = response.get_json()['upload']
+            assert upload['method'] == 'PUT'
+            assert upload['key'] == f'collections/{r2_test_collection.uuid}/direct.jpg'
+            assert mock_r2_client.generate_presigned_url.call_args[0][0] == 'put_object'
+
+            response = client.post('/collections/api/complete-upload', json={
+                'collection_id': r2_test_collection.id,
+                'filename': 'direct.jpg'
+            })
+
+            # A client retry gets the same record back instead of a duplicate row
+            retry = client.post('/collections/api/complete-upload', json={
+                'collection_id': r2_test_collection.id,
+                'filename': 'direct.jpg'
+            })
+
+        assert response.status_code == 200
+        uploaded = response.get_json()['uploaded_files'][0]
+        mock_enqueue.assert_called_once()
+        assert retry.status_code == 200
+        assert retry.get_json()['uploaded_files'][0]['uuid'] == uploaded['uuid']
+
+        with app.app_context():
+            assert File.query.filter_by(collection_id=r2_test_collection.id).count() == 1
+            file_record = File.query.filter_by(uuid=UUID(uploaded['uuid'])).first()
+            assert file_record.storage_backend == 'r2'
+            assert file_record.size == 1024
+            assert file_record.get_metadata()['upload_method'] == 'presigned_put'
+
+    def test_presign_checks_type_and_size_like_storage(self, app, client, r2_test_user, r2_test_collection,
+                                                       mock_r2_client, mock_r2_config):
+        """Test that presigning accepts what storage accepts and rejects bad input with a 400."""
+        login_as(client, r2_test_user)
+
+        with app.app_context():
+            r2_storage = CloudflareR2Storage()
+
+        def presign(**overrides):
+            payload = {
+                'collection_id': r2_test_collection.id,
+                'filename': 'photo.heic',
+                'content_type': 'image/heic',
+                'size': 1024
+            }
+            payload.update(overrides)
+            return client.post('/collections/api/presign', json=payload)
+
+        with patch.dict(app.config, {'STORAGE_BACKEND': 'r2'}), \
+             patch.object(app, 'r2_storage', r2_storage, create=True):
+            assert presign().status_code == 200
+            assert presign(size='1024').status_code == 400
+            assert presign(size=None).status_code == 400
+            assert presign(size=-1).status_code == 400
+
+            # Validation errors raised by the storage layer are the client's fault too
+            with patch.object(r2_storage, 'generate_presigned_upload',
+                              side_effect=ValidationError('Invalid MIME type: image/heic')):
+                response = presign()
+
+        assert response.status_code == 400
+        assert response.get_json()['error'] == 'Invalid MIME type: image/heic'
+
+    def test_upload_rejects_image_name_with_other_content(self, app, r2_test_collection,
+                                                          mock_r2_client, mock_r2_config):
+        """Test that R2 uploads are checked by magic number before anything is sent."""
+        with app.app_context():
+            storage = StorageService()
+            storage.backend = 'r2'
+            storage.r2_storage = CloudflareR2Storage()
+
+            result = storage.upload_file(
+                file_obj=io.BytesIO(b'<html>not an image</html>'),
+                filename='disguised.jpg',
+                collection=r2_test_collection
+            )
+
+        assert result['success'] is False
+        assert 'not a supported image type' in result['error']
+        mock_r2_client.upload_fileobj.assert_not_called()
+        mock_r2_client.create_multipart_upload.assert_not_called()
+
+    def test_direct_upload_with_other_content_is_deleted(self, app, r2_test_collection,
+                                                         mock_r2_client, mock_r2_config):
+        """Test that a presigned upload whose bytes are not an image is removed."""
+        mock_r2_client.get_object.return_value = {'Body': io.BytesIO(b'MZ\x90\x00 executable')}
+
+        with app.app_context():
+            storage = StorageService()
+            storage.backend = 'r2'
+            storage.r2_storage = CloudflareR2Storage()
+
+            result = storage.complete_direct_upload('direct.jpg', r2_test_collection)
+
+        assert result['success'] is False
+        assert mock_r2_client.get_object.call_args.kwargs['Range'] == 'bytes=0-31'
+        mock_r2_client.delete_object.assert_called_once()
+
     def test_r2_upload_multipart_simulation(self, app, r2_test_collection, mock_r2_client, mock_r2_config):
         """Test R2 multipart upload simulation."""
         with app.app_context():
@@ -329,8 +635,8 @@ class TestR2UploadIntegration:
 
             storage = StorageService()
 
-            # Create a large file buffer (simulate multipart threshold)
-            large_file = io.BytesIO(b'0' * (101 * 1024 * 1024))  # 101MB
+            # Create a large JPEG-signed buffer (simulate multipart threshold)
+            large_file = io.BytesIO(b'\xff\xd8\xff\xe0' + b'0' * (101 * 1024 * 1024 - 4))  # 101MB
 
             # Mock multipart upload response
             with patch.object(storage.r2_storage, 'upload_single_file') as mock_upload:
@@ -426,6 +732,28 @@ class TestFileModel:
             assert local_file.is_r2_file is False
             assert local_file.is_image is True
 
+    def test_file_is_image_stored_with_row(self, app, r2_test_collection):
+        """Test that is_image follows mime_type and can be filtered in SQL."""
+        with app.app_context():
+            document = File(
+                filename='notes.pdf',
+                original_filename='notes.pdf',
+                mime_type='application/pdf',
+                size=1024,
+                storage_path='uploads/test/notes.pdf',
+                collection_id=r2_test_collection.id
+            )
+            assert document.is_image is False
+
+            document.mime_type = 'image/png'
+            assert document.is_image is True
+
+            db.session.add(document)
+            db.session.commit()
+
+            images = File.query.filter_by(collection_id=r2_test_collection.id, is_image=True).all()
+            assert document in images
+
     def test_file_metadata_methods(self, app, r2_test_collection):
         """Test File model metadata handling methods."""
         with app.app_context():
@@ -11,6 +11,7 @@ from PIL import Image
 from app import create_app
 from app.models import db, User, Collection, File
 from app.services.thumbnail_service import ThumbnailService
+from tests.helpers import count_queries
 
 
 @pytest.fixture(scope='function')
@@ -100,7 +101,7 @@ class TestThumbnailService:
 
                         assert result is not None
                         assert result.startswith('thumbnails/')
-                        assert file_record.collection.uuid in result
+                        assert str(file_record.collection.uuid) in result
 
     @patch('app.services.thumbnail_service.PIL_AVAILABLE', True)
     def test_generate_thumbnail_success_r2(self, app, thumbnail_test_collection, sample_jpeg):
@@ -328,4 +329,179 @@ class TestThumbnailService:
 
         assert result is not None
         # The result should be JPEG (no transparency)
-        assert result.startswith(b'\xff\xd8')  # JPEG magic bytes
\ No newline at end of file
+        assert result.startswith(b'\xff\xd8')  # JPEG magic bytes
+
+class TestVariantQueue:
+    """Test background variant generation queueing."""
+
+    def test_enqueue_submits_to_background_pool(self, app):
+        """Test that variant jobs are submitted rather than run inline."""
+        from app.services.thumbnail_service import enqueue_variant_generation, _run_variant_job
+
+        with app.app_context():
+            mock_pool = MagicMock()
+            with patch.dict(app.config, {'VARIANT_WORKERS': 2}), \
+                 patch('app.services.thumbnail_service._queued_file_ids', set()):
+                with patch('app.services.thumbnail_service.get_app_executor',
+                           return_value=mock_pool) as mock_get_executor:
+                    with patch.object(ThumbnailService, 'generate_all_variants') as mock_generate:
+                        enqueue_variant_generation([1, 2])
+
+            mock_get_executor.assert_called_once_with(app, 'variant_pool', 2)
+            assert mock_pool.submit.call_count == 2
+            mock_pool.submit.assert_any_call(_run_variant_job, app, 1)
+            mock_generate.assert_not_called()
+
+    def test_enqueue_skips_files_already_queued(self, app):
+        """Test that a file is not queued again until its pending job has run."""
+        from app.services.thumbnail_service import enqueue_variant_generation, _run_variant_job
+
+        with app.app_context():
+            mock_pool = MagicMock()
+            with patch.dict(app.config, {'VARIANT_WORKERS': 2}), \
+                 patch('app.services.thumbnail_service._queued_file_ids', set()), \
+                 patch('app.services.thumbnail_service.get_app_executor', return_value=mock_pool), \
+                 patch('app.services.thumbnail_service._generate_variants_for'):
+                enqueue_variant_generation([7])
+                enqueue_variant_generation([7])
+                assert mock_pool.submit.call_count == 1
+
+                _run_variant_job(app, 7)
+                enqueue_variant_generation([7])
+                assert mock_pool.submit.call_count == 2
+
+    def test_enqueue_runs_inline_without_workers(self, app, thumbnail_test_collection):
+        """Test that VARIANT_WORKERS=0 generates variants on the calling thread."""
+        from app.services.thumbnail_service import enqueue_variant_generation
+
+        with app.app_context():
+            file_record = File(
+                filename='inline.jpg',
+                original_filename='inline.jpg',
+                mime_type='image/jpeg',
+                size=100,
+                storage_path='test/path/inline.jpg',
+                storage_backend='local',
+                collection_id=thumbnail_test_collection.id
+            )
+            db.session.add(file_record)
+            db.session.commit()
+
+            with patch.dict(app.config, {'VARIANT_WORKERS': 0}):
+                with patch.object(ThumbnailService, 'generate_all_variants',
+                                  return_value={'success': True}) as mock_generate:
+                    enqueue_variant_generation([file_record.id])
+
+            mock_generate.assert_called_once_with(file_record)
+
+
+class TestVariantPipeline:
+    """Test variant encoding overlapped with uploads."""
+
+    def test_paths_saved_after_commit(self, app, thumbnail_test_collection):
+        """Test that variants encoded before commit are saved on the File row."""
+        from app.services.thumbnail_service import VariantPipeline
+
+        with app.app_context():
+            file_record = File(
+                filename='pipeline.jpg',
+                original_filename='pipeline.jpg',
+                mime_type='image/jpeg',
+                size=100,
+                storage_path='test/path/pipeline.jpg',
+                storage_backend='local',
+                collection_id=thumbnail_test_collection.id
+            )
+            upload = io.BytesIO(b'image-bytes')
+            variant_paths = {'thumb_path': 'test/path/pipeline_thumb.jpg',
+                             'medium_path': 'test/path/pipeline_medium.jpg'}
+
+            with patch.dict(app.config, {'VARIANT_WORKERS': 0}):
+                with patch.object(ThumbnailService, 'encode_variants',
+                                  return_value={'variant_paths': variant_paths, 'errors': []}) as mock_encode:
+                    pipeline = VariantPipeline()
+                    pipeline.submit(file_record, upload)
+
+                    db.session.add(file_record)
+                    db.session.commit()
+                    pipeline.record_paths()
+
+            mock_encode.assert_called_once_with(b'image-bytes', 'test/path/pipeline.jpg')
+            assert upload.closed
+            assert file_record.thumb_path == 'test/path/pipeline_thumb.jpg'
+            assert file_record.medium_path == 'test/path/pipeline_medium.jpg'
+
+    def test_discard_deletes_variants_of_uncommitted_files(self, app, thumbnail_test_collection):
+        """Test that variants are removed from storage when their File rows are never saved."""
+        from app.services.storage_service import StorageService
+        from app.services.thumbnail_service import VariantPipeline
+
+        def encode(image_data, storage_path):
+            stem = storage_path.rsplit('.', 1)[0]
+            return {'variant_paths': {'thumb_path': f'{stem}_thumb.jpg',
+                                      'medium_path': f'{stem}_medium.jpg'}, 'errors': []}
+
+        def pending_file(name):
+            return File(filename=name, original_filename=name, mime_type='image/jpeg', size=100,
+                        storage_path=f'test/path/{name}', storage_backend='local',
+                        collection_id=thumbnail_test_collection.id)
+
+        with app.app_context():
+            with patch.dict(app.config, {'VARIANT_WORKERS': 0}), \
+                 patch.object(ThumbnailService, 'encode_variants', side_effect=encode), \
+                 patch.object(StorageService, 'delete_path') as mock_delete:
+                pipeline = VariantPipeline()
+                pipeline.submit(pending_file('orphan.jpg'), io.BytesIO(b'image-bytes'))
+                pipeline.discard()
+
+                # An upload finishing after the request gave up is cleaned up too
+                pipeline.submit(pending_file('late.jpg'), io.BytesIO(b'image-bytes'))
+
+                # Nothing is left for a commit to save
+                pipeline.record_paths()
+
+        deleted = [call.args[0] for call in mock_delete.call_args_list]
+        assert deleted == [
+            'test/path/orphan_thumb.jpg', 'test/path/orphan_medium.jpg',
+            'test/path/late_thumb.jpg', 'test/path/late_medium.jpg'
+        ]
+
+    def test_finished_encodes_saved_in_one_update(self, app, thumbnail_test_collection):
+        """Test that variants already encoded at commit time are written with a single UPDATE."""
+        from app.services.thumbnail_service import VariantPipeline
+
+        with app.app_context():
+            file_records = [
+                File(
+                    filename=f'bulk_{i}.jpg',
+                    original_filename=f'bulk_{i}.jpg',
+                    mime_type='image/jpeg',
+                    size=100,
+                    storage_path=f'test/path/bulk_{i}.jpg',
+                    storage_backend='local',
+                    collection_id=thumbnail_test_collection.id
+                )
+                for i in range(3)
+            ]
+
+            def encode(image_data, storage_path):
+                stem = storage_path.rsplit('.', 1)[0]
+                return {'variant_paths': {'thumb_path': f'{stem}_thumb.jpg',
+                                          'medium_path': f'{stem}_medium.jpg'}, 'errors': []}
+
+            with patch.dict(app.config, {'VARIANT_WORKERS': 0}):
+                with patch.object(ThumbnailService, 'encode_variants', side_effect=encode):
+                    pipeline = VariantPipeline()
+                    for file_record in file_records:
+                        pipeline.submit(file_record, io.BytesIO(b'image-bytes'))
+
+                    db.session.add_all(file_records)
+                    db.session.commit()
+
+                    with count_queries(lambda statement: statement.startswith('UPDATE files')) as statements:
+                        pipeline.record_paths()
+
+            assert len(statements) == 1
+            assert [f.thumb_path for f in file_records] == [
+                f'test/path/bulk_{i}_thumb.jpg' for i in range(3)
+            ]
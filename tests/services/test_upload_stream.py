@@ -0,0 +1,86 @@
+"""
+Tests for incremental multipart upload parsing.
+"""
+
+import io
+from tempfile import SpooledTemporaryFile
+from unittest.mock import patch
+
+import pytest
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import ClientDisconnected, RequestEntityTooLarge
+from werkzeug.test import encode_multipart
+
+from app.services.upload_stream import iter_multipart_parts
+
+
+def _encode(fields):
+    """Encode fields as a multipart body, returning (stream, boundary)."""
+    boundary, body = encode_multipart(fields)
+    return io.BytesIO(body), boundary.encode('latin-1')
+
+
+class TestIterMultipartParts:
+    """Test the streaming multipart parser."""
+
+    def test_yields_fields_and_files_in_order(self):
+        """Test that fields and files come back in body order with their content."""
+        stream, boundary = _encode({
+            'collection_id': '42',
+            'file_a': FileStorage(io.BytesIO(b'a' * 3000), filename='a.jpg'),
+            'file_b': FileStorage(io.BytesIO(b'bb'), filename='b.png'),
+        })
+
+        parts = list(iter_multipart_parts(stream, boundary, chunk_size=512))
+
+        assert [name for name, _ in parts] == ['collection_id', 'file_a', 'file_b']
+        assert parts[0][1] == '42'
+
+        file_a = parts[1][1]
+        assert file_a.filename == 'a.jpg'
+        assert file_a.content_length == 3000
+        assert file_a.stream.read() == b'a' * 3000
+
+        file_b = parts[2][1]
+        assert file_b.filename == 'b.png'
+        assert file_b.stream.read() == b'bb'
+
+    def test_files_are_yielded_before_body_is_consumed(self):
+        """Test that a file is handed over before the rest of the body is read."""
+        stream, boundary = _encode({
+            'file_a': FileStorage(io.BytesIO(b'a' * 100), filename='a.jpg'),
+            'file_b': FileStorage(io.BytesIO(b'b' * 100_000), filename='b.jpg'),
+        })
+
+        parts = iter_multipart_parts(stream, boundary, chunk_size=1024)
+        name, _ = next(parts)
+
+        assert name == 'file_a'
+        assert stream.tell() < len(stream.getvalue())
+
+    def test_oversized_field_rejected(self):
+        """Test that a form field over the memory limit raises 413."""
+        stream, boundary = _encode({'collection_id': 'x' * 2048})
+
+        with pytest.raises(RequestEntityTooLarge):
+            list(iter_multipart_parts(stream, boundary, max_form_memory_size=1024, chunk_size=256))
+
+    def test_truncated_body_rejected_and_spool_closed(self):
+        """Test that a body cut off inside a file raises instead of passing as complete."""
+        stream, boundary = _encode({
+            'collection_id': '42',
+            'file_a': FileStorage(io.BytesIO(b'a' * 3000), filename='a.jpg'),
+        })
+        truncated = io.BytesIO(stream.getvalue()[:2000])
+        spools = []
+
+        def make_spool(**kwargs):
+            spools.append(SpooledTemporaryFile(**kwargs))
+            return spools[-1]
+
+        with patch('app.services.upload_stream.SpooledTemporaryFile', side_effect=make_spool):
+            with pytest.raises(ClientDisconnected):
+                list(iter_multipart_parts(truncated, boundary, chunk_size=512))
+
+        assert len(spools) == 1
+        assert spools[0].closed
@@ -6,6 +6,12 @@ import pytest
 from app import create_app
 
 
+@pytest.fixture(scope='module')
+def factory_app():
+    """One factory-built app shared by the tests that only inspect it."""
+    return create_app()
+
+
 class TestApplicationFactory:
     """Test cases for the application factory pattern."""
 
@@ -15,9 +21,9 @@ class TestApplicationFactory:
         assert app is not None
         assert app.name == 'app'
 
-    def test_app_has_secret_key(self):
+    def test_app_has_secret_key(self, factory_app):
         """Test that the application has a secret key configured."""
-        app = create_app()
+        app = factory_app
         assert app.config.get('SECRET_KEY') is not None
 
     def test_testing_config(self):
@@ -26,29 +32,29 @@ class TestApplicationFactory:
         app.config.update({'TESTING': True})
         assert app.config['TESTING'] is True
 
-    def test_app_context_works(self):
+    def test_app_context_works(self, factory_app):
         """Test that application context can be created and used."""
-        app = create_app()
+        app = factory_app
         with app.app_context():
             from flask import current_app
             assert current_app.name == app.name
 
-    def test_request_context_works(self):
+    def test_request_context_works(self, factory_app):
         """Test that request context can be created and used."""
-        app = create_app()
+        app = factory_app
         with app.test_request_context('/'):
             from flask import request
             assert request.path == '/'
 
-    def test_blueprints_registered(self):
+    def test_blueprints_registered(self, factory_app):
         """Test that required blueprints are registered."""
-        app = create_app()
+        app = factory_app
         blueprint_names = [bp.name for bp in app.blueprints.values()]
         assert 'main' in blueprint_names
 
-    def test_app_url_map(self):
+    def test_app_url_map(self, factory_app):
         """Test that the application has the expected routes."""
-        app = create_app()
+        app = factory_app
         with app.app_context():
             rules = [rule.rule for rule in app.url_map.iter_rules()]
             assert '/' in rules  # Home route should exist
\ No newline at end of file